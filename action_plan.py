@@ -0,0 +1,72 @@
+import dataclasses
+import enum
+import json
+from collections import Counter
+from datetime import datetime
+from typing import List, Dict
+
+
+class ActionKind(str, enum.Enum):
+    recruit = "recruit"
+    target_crew = "target_crew"
+    extend_space = "extend_space"
+    buy = "buy"
+    expansion = "expansion"
+    assign = "assign"
+    # crew for vehicles bought by the same plan, their ids are known only after buying
+    assign_bought = "assign_bought"
+
+
+# order in which actions of a single building are executed
+EXECUTION_ORDER = [
+    ActionKind.extend_space,
+    ActionKind.buy,
+    ActionKind.assign,
+    ActionKind.assign_bought,
+    ActionKind.expansion,
+]
+
+
+@dataclasses.dataclass
+class Action:
+    kind: ActionKind
+    building_id: str
+    building_name: str
+    category: str
+    payload: dict
+
+    def __str__(self):
+        return f"{self.kind.value} {self.building_name} ({self.building_id}): {self.payload}"
+
+
+@dataclasses.dataclass
+class ActionPlan:
+    cpr: str
+    actions: List[Action]
+    created_at: str = dataclasses.field(default_factory=lambda: datetime.now().isoformat())
+
+    def save(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(json.dumps(dataclasses.asdict(self), indent=2, ensure_ascii=False))
+
+    @classmethod
+    def load(cls, path: str) -> "ActionPlan":
+        with open(path, 'r') as f:
+            raw = json.loads(f.read())
+        actions = [Action(**{**action, "kind": ActionKind(action["kind"])}) for action in raw["actions"]]
+        return cls(cpr=raw["cpr"], actions=actions, created_at=raw["created_at"])
+
+    def of_kinds(self, *kinds: ActionKind) -> List[Action]:
+        return [action for action in self.actions if action.kind in kinds]
+
+    def by_building(self) -> Dict[str, List[Action]]:
+        buildings = {}
+        for action in self.of_kinds(*EXECUTION_ORDER):
+            buildings.setdefault(action.building_id, []).append(action)
+        return {
+            building_id: sorted(actions, key=lambda action: EXECUTION_ORDER.index(action.kind))
+            for building_id, actions in buildings.items()
+        }
+
+    def summary(self) -> Counter:
+        return Counter(action.kind.value for action in self.actions)
@@ -0,0 +1,173 @@
+"""
+Parser and round-trip benchmarks on a synthetic fleet served by a fake driver.
+
+    python -m benchmarks.bench --sizes 10,100,1000 --json bench.json --baseline benchmarks/baseline.json
+
+Every WebDriver call of the fake driver is counted, so a change adding round trips to a
+parser shows up as a higher commands/call number and fails the run against a baseline.
+"""
+import dataclasses
+import json
+import sys
+import time
+from collections import Counter
+from configparser import ConfigParser
+
+import click
+from termcolor import cprint
+
+from benchmarks.fake_driver import FakeDriver, FakeSession
+from benchmarks.site import SyntheticSite
+from build_expansions import get_expansions_to_build, queue_building_expansions
+from builder import get_list_of_buildings, get_crew_members, get_building_details, buy_needed_vehicles, \
+    assign_crew_to_vehicles, set_recruitment, _get_vehicle_target
+from builder_const import BuildingCategory, Config
+from crew_planner import plan_crew_assignment
+from http_reader import HttpReader
+from page_cache import PAGE_CACHE
+from vehicle_catalog import VehicleCatalog
+
+
+CONFIG_DEFAULTS = {
+    "cpr": 1,
+    "headless": True,
+    "builder_schema_file": "builder_schema.json",
+    "building_category": BuildingCategory.JRG,
+    "building_categories": [BuildingCategory.JRG],
+    "workers": 1,
+    "max_rps": 0,
+}
+
+
+def make_config(builder_schema: dict, **overrides) -> Config:
+    ini = ConfigParser()
+    ini.read_dict({
+        "JRG": {"pr": "True", "containers": "5"},
+        "RECRUITMENT": {"duration": "Auto", "target_crew": "300"},
+    })
+    values = {field.name: CONFIG_DEFAULTS.get(field.name) for field in dataclasses.fields(Config)}
+    values.update(builder_schema=builder_schema, ini=ini, dry_run=False, **overrides)
+    return Config(**values)
+
+
+class Recorder:
+    def __init__(self, driver: FakeDriver, session: FakeSession):
+        self.driver = driver
+        self.session = session
+        self.results = {}
+
+    def measure(self, name: str, function, *args, **kwargs):
+        # every call is measured reading the pages, not the run cache
+        PAGE_CACHE.clear()
+        commands_before = Counter(self.driver.commands)
+        requests_before = self.session.requests
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+        commands = self.driver.commands - commands_before
+        if self.session.requests > requests_before:
+            commands["http_get"] = self.session.requests - requests_before
+        entry = self.results.setdefault(name, {"calls": 0, "seconds": 0.0, "commands": Counter()})
+        entry["calls"] += 1
+        entry["seconds"] += elapsed
+        entry["commands"].update(commands)
+        return result
+
+    def summary(self) -> dict:
+        return {
+            name: {
+                "calls": entry["calls"],
+                "seconds": round(entry["seconds"], 4),
+                "avg_ms": round(1000 * entry["seconds"] / entry["calls"], 3),
+                "round_trips_per_call": round(sum(entry["commands"].values()) / entry["calls"], 3),
+                "commands": dict(entry["commands"]),
+            }
+            for name, entry in self.results.items()
+        }
+
+
+def run_fleet(size: int, builder_schema: dict) -> dict:
+    site = SyntheticSite(buildings=size)
+    driver = FakeDriver(site)
+    session = FakeSession(site)
+    reader = HttpReader(session)
+    recorder = Recorder(driver, session)
+    config = make_config(builder_schema)
+    catalog = VehicleCatalog(None)
+
+    buildings = recorder.measure("get_list_of_buildings", get_list_of_buildings, driver, site.cpr)
+    recorder.measure("get_list_of_buildings[http]", get_list_of_buildings, driver, site.cpr, BuildingCategory.JRG, reader)
+    recorder.measure("set_recruitment", set_recruitment, driver, buildings, config)
+    for building in buildings:
+        recorder.measure("get_crew_members", get_crew_members, driver, building)
+        recorder.measure("get_crew_members[http]", get_crew_members, driver, building, reader)
+        recorder.measure("get_building_details", get_building_details, driver, building)
+        recorder.measure("get_building_details[http]", get_building_details, driver, building, reader)
+        recorder.measure("plan_crew_assignment", plan_crew_assignment, building, builder_schema)
+        to_build = recorder.measure("get_expansions_to_build", get_expansions_to_build, driver, building, config)
+        if sum(to_build.values()) > 0:
+            recorder.measure(
+                "queue_building_expansions", queue_building_expansions, driver, building, to_build, False,
+            )
+        recorder.measure("buy_needed_vehicles", buy_needed_vehicles, driver, building, builder_schema, False, catalog)
+        get_building_details(driver, building, reader)
+        get_crew_members(driver, building, reader)
+        recorder.measure("assign_crew_to_vehicles", assign_crew_to_vehicles, driver, building, config,
+                         fresh_crew=True)
+    return recorder.summary()
+
+
+def print_results(size: int, results: dict) -> None:
+    cprint(f'----- {size} buildings -----', 'magenta')
+    cprint(f'{"function":32} {"calls":>6} {"total s":>9} {"avg ms":>9} {"trips/call":>11}', 'cyan')
+    for name, result in results.items():
+        print(
+            f'{name:32} {result["calls"]:>6} {result["seconds"]:>9.3f} {result["avg_ms"]:>9.3f} '
+            f'{result["round_trips_per_call"]:>11.2f}'
+        )
+
+
+def compare(results: dict, baseline: dict) -> list:
+    regressions = []
+    for size, functions in results.items():
+        for name, result in functions.items():
+            expected = baseline.get(size, {}).get(name)
+            if expected and result["round_trips_per_call"] > expected["round_trips_per_call"]:
+                regressions.append(
+                    f'{name} at {size} buildings: {result["round_trips_per_call"]} round trips per call, '
+                    f'baseline {expected["round_trips_per_call"]}'
+                )
+    return regressions
+
+
+@click.command()
+@click.option("--sizes", "sizes", default="10,100,1000", type=click.STRING)
+@click.option("--builder-schema", "builder_schema", default="builder_schema.json", type=click.STRING)
+@click.option("--json", "json_file", default=None, type=click.STRING)
+@click.option("--baseline", "baseline_file", default=None, type=click.STRING)
+def bench(sizes, builder_schema, json_file, baseline_file):
+    with open(builder_schema, 'r') as f:
+        schema = {key: _get_vehicle_target(v) for key, v in json.loads(f.read()).items()}
+
+    results = {}
+    for size in [int(size) for size in sizes.split(",")]:
+        results[str(size)] = run_fleet(size, schema)
+        print_results(size, results[str(size)])
+
+    if json_file:
+        with open(json_file, 'w') as f:
+            f.write(json.dumps(results, indent=2))
+        cprint(f'Results saved into {json_file}', 'green')
+
+    if baseline_file:
+        with open(baseline_file, 'r') as f:
+            regressions = compare(results, json.loads(f.read()))
+        for regression in regressions:
+            cprint(regression, 'red')
+        if regressions:
+            sys.exit(1)
+        cprint('No round trip regressions against the baseline', 'green')
+
+
+if __name__ == "__main__":
+    bench()
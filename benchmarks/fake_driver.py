@@ -0,0 +1,265 @@
+import dataclasses
+import re
+from collections import Counter
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+
+from benchmarks.site import SyntheticSite
+from http_reader import HtmlNode, HtmlPage
+from utils import TABLE_DATA_SCRIPT, CLICK_HREF_SCRIPT, FETCH_ALL_SCRIPT
+from vehicle_catalog import CATALOG_SCRIPT
+from waits import PAGE_REPLACED_SCRIPT, TABLE_PRESENT_SCRIPT
+
+
+BASE_URL = "https://www.operatorratunkowy.pl"
+XPATH_RE = re.compile(r'^//\*\[@id="([^"]+)"\]((?:/[a-z0-9]+(?:\[\d+\])?)*)$')
+
+
+class FakeNoSuchElement(Exception):
+    pass
+
+
+def _is_displayed(node: HtmlNode) -> bool:
+    while node is not None:
+        if "display: none" in (node.attrs.get("style") or ""):
+            return False
+        node = node.parent
+    return True
+
+
+def _evaluate_xpath(page: HtmlPage, xpath: str) -> Optional[HtmlNode]:
+    match = XPATH_RE.match(xpath)
+    if not match:
+        raise NotImplementedError(f"Fake driver does not support xpath {xpath}")
+    node = page.find_by_id(match.group(1))
+    for step in filter(None, match.group(2).split("/")):
+        if node is None:
+            return None
+        tag, _, index = step.partition("[")
+        children = node.children_by_tag(tag)
+        position = int(index[:-1]) if index else 1
+        node = children[position - 1] if len(children) >= position else None
+    return node
+
+
+class FakeElement:
+    def __init__(self, driver: "FakeDriver", node: HtmlNode):
+        self._driver = driver
+        self.node = node
+
+    @property
+    def text(self) -> str:
+        self._driver.count("element.text")
+        return self.node.text if _is_displayed(self.node) else ""
+
+    def get_attribute(self, name: str):
+        self._driver.count("element.get_attribute")
+        if name == "href" and "href" in self.node.attrs:
+            return urljoin(self._driver.current_url, self.node.attrs["href"])
+        if name == "innerHTML":
+            return self.node.inner_html
+        return self.node.attrs.get(name)
+
+    def is_displayed(self) -> bool:
+        self._driver.count("element.is_displayed")
+        return _is_displayed(self.node)
+
+    def find_element(self, by: str, value: str) -> "FakeElement":
+        elements = self.find_elements(by, value)
+        if not elements:
+            raise FakeNoSuchElement(f"{by}={value}")
+        return elements[0]
+
+    def find_elements(self, by: str, value: str):
+        self._driver.count("element.find_elements")
+        return [FakeElement(self._driver, node) for node in self._driver.select(self.node, by, value)]
+
+    def clear(self) -> None:
+        self._driver.count("element.clear")
+        self.node.attrs["value"] = ""
+
+    def send_keys(self, keys: str) -> None:
+        self._driver.count("element.send_keys")
+        self.node.attrs["value"] = (self.node.attrs.get("value") or "") + keys
+
+    def click(self) -> None:
+        self._driver.count("element.click")
+        self._driver.click_node(self.node)
+
+
+class FakeDriver:
+    """
+    Minimal WebDriver serving a SyntheticSite in-process. Every method call that would be
+    a WebDriver HTTP round trip is counted in `commands`.
+    """
+
+    def __init__(self, site: SyntheticSite, base_url: str = BASE_URL):
+        self.site = site
+        self.base_url = base_url
+        self.commands = Counter()
+        self.current_url = ""
+        self.page: Optional[HtmlPage] = None
+
+    def count(self, command: str) -> None:
+        self.commands[command] += 1
+
+    # navigation
+
+    def get(self, url: str) -> None:
+        self.count("get")
+        self._load(url)
+
+    def _load(self, url: str) -> None:
+        for _ in range(10):
+            status, body = self.site.render(urlparse(url).path)
+            if status != 302:
+                break
+            url = urljoin(url, body)
+        self.current_url = urljoin(self.base_url, url)
+        self.page = HtmlPage(body, self.current_url)
+
+    def refresh(self) -> None:
+        self.count("refresh")
+        self._load(self.current_url)
+
+    def click_node(self, node: HtmlNode) -> None:
+        href = node.attrs.get("href")
+        classes = node.classes
+        if "personal_count_target_edit_button" in classes:
+            node.parent.find("form").attrs["style"] = ""
+        elif "btn-success" in classes and node.tag == "input":
+            form = node.parent
+            value = form.find_by_id("building_personal_count_target").attrs.get("value")
+            building_id = int(form.attrs["action"].split("/")[2])
+            self.site.set_target_crew(building_id, value)
+            form.attrs["style"] = "display: none"
+            form.parent.find("span").children = [value]
+        elif href and href.startswith("#"):
+            for pane in self.page.find_all_by_class("tab-pane"):
+                pane.attrs["style"] = "" if pane.attrs.get("id") == href[1:] else "display: none"
+        elif href:
+            self._follow(urljoin(self.current_url, href))
+
+    def _follow(self, url: str) -> None:
+        # actions coming back to the same page behave like ajax calls, the shown tab stays shown
+        previous_url = self.current_url
+        shown = {pane.attrs.get("id"): pane.attrs.get("style") for pane in self.page.find_all_by_class("tab-pane")}
+        self._load(url)
+        if self.current_url == previous_url:
+            for pane in self.page.find_all_by_class("tab-pane"):
+                pane.attrs["style"] = shown.get(pane.attrs.get("id"), pane.attrs.get("style"))
+
+    # elements
+
+    def select(self, root: HtmlNode, by: str, value: str):
+        if by == "id":
+            return [node for node in root.iter() if node.attrs.get("id") == value]
+        if by == "class name":
+            return root.find_all_by_class(value)
+        if by == "tag name":
+            return root.find_all(value)
+        if by == "xpath":
+            node = _evaluate_xpath(self.page, value)
+            return [node] if node is not None else []
+        raise NotImplementedError(f"Fake driver does not support {by}")
+
+    def find_element(self, by: str, value: str) -> FakeElement:
+        self.count("find_element")
+        elements = [FakeElement(self, node) for node in self.select(self.page.root, by, value)]
+        if not elements:
+            raise FakeNoSuchElement(f"{by}={value}")
+        return elements[0]
+
+    def find_elements(self, by: str, value: str):
+        self.count("find_elements")
+        return [FakeElement(self, node) for node in self.select(self.page.root, by, value)]
+
+    # scripts
+
+    def execute_script(self, script: str, *args):
+        self.count("execute_script")
+        if script == TABLE_DATA_SCRIPT:
+            return [[dataclasses.asdict(cell) for cell in row] for row in self.page.table_data(*args)]
+        if script == CLICK_HREF_SCRIPT:
+            for link in self.page.root.find_all("a"):
+                if urljoin(self.current_url, link.attrs.get("href") or "") == args[0]:
+                    self.click_node(link)
+                    return True
+            return False
+        if script == CATALOG_SCRIPT:
+            return [
+                [card.find("h3").text, urljoin(self.current_url, card.find_all("a")[1].attrs["href"])]
+                for card in self.page.find_all_by_class("vehicle_type")
+            ]
+        if script == "arguments[0].click();":
+            self.click_node(args[0].node)
+            return None
+        if script == PAGE_REPLACED_SCRIPT:
+            # clicks navigate synchronously here
+            return True
+        if "navigator.userAgent" in script:
+            return "FakeDriver"
+        if script == TABLE_PRESENT_SCRIPT:
+            table_id, class_name = args
+            if table_id:
+                return self.page.find_by_id(table_id) is not None
+            return bool(self.page.find_all_by_class(class_name))
+        if "getElementById(arguments[0])" in script and "innerText" in script:
+            node = self.page.find_by_id(args[0])
+            return node.text if node is not None else None
+        raise NotImplementedError(f"Fake driver does not know the script:\n{script}")
+
+    def execute_async_script(self, script: str, *args):
+        self.count("execute_async_script")
+        if script == FETCH_ALL_SCRIPT:
+            return [self._fetch(request["url"], request["data"]) for request in args[0]]
+        raise NotImplementedError(f"Fake driver does not know the async script:\n{script}")
+
+    def _fetch(self, url: str, data: Optional[dict]) -> int:
+        # the page stays where it is, like with fetch() in the browser, redirects are followed
+        path = urlparse(url).path
+        if data:
+            building_id = int(path.split("/")[2])
+            self.site.set_target_crew(building_id, data["building[personal_count_target]"])
+            return 200
+        status, _ = self.site.render(path)
+        return 200 if status == 302 else status
+
+    def save_screenshot(self, path: str) -> bool:
+        return True
+
+    def get_cookies(self):
+        return []
+
+    def quit(self) -> None:
+        pass
+
+
+class FakeResponse:
+    def __init__(self, status: int, text: str, url: str):
+        self.status_code = status
+        self.text = text
+        self.url = url
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"{self.status_code} for {self.url}")
+
+
+class FakeSession:
+    """requests.Session stand-in for HttpReader, serving the same SyntheticSite."""
+
+    def __init__(self, site: SyntheticSite, base_url: str = BASE_URL):
+        self.site = site
+        self.base_url = base_url
+        self.requests = 0
+        self.headers = {}
+
+    def get(self, url: str, timeout=None, **kwargs) -> FakeResponse:
+        self.requests += 1
+        for _ in range(10):
+            status, body = self.site.render(urlparse(url).path)
+            if status != 302:
+                return FakeResponse(status, body, urljoin(self.base_url, url))
+            url = urljoin(url, body)
+        raise RuntimeError(f"Too many redirects for {url}")
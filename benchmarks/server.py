@@ -0,0 +1,177 @@
+"""
+Stand-in game server: the SyntheticSite served over HTTP, so the whole builder, browser included,
+runs against it offline.
+
+    python -m benchmarks.server --buildings 1000 --port 8000 --latency-ms 50
+    GAME_URL=http://127.0.0.1:8000 builder --cpr 1 --metrics-out metrics.json
+
+Any login and password are accepted, pages other than sign in need the session cookie like the game does.
+"""
+import re
+import secrets
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+from urllib.parse import parse_qs, urlparse
+
+import click
+from termcolor import cprint
+
+from benchmarks.site import SyntheticSite, BUILDING_CATEGORIES
+
+
+SESSION_COOKIE = "_session_id"
+
+
+def parse_form(content_type: str, body: bytes) -> Dict[str, str]:
+    """Fields of an urlencoded form post or of a multipart FormData sent by fetch()."""
+    if content_type.startswith("multipart/form-data"):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+        )
+        return {
+            part.get_param("name", header="content-disposition"): part.get_content()
+            for part in message.iter_parts()
+        }
+    return {key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()}
+
+
+class GameServer:
+    def __init__(self, site: SyntheticSite, host: str = "127.0.0.1", port: int = 8000, latency: float = 0.0):
+        self.site = site
+        self.latency = latency
+        self.sessions = set()
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self) -> None:
+        self.server.serve_forever()
+
+    def start(self) -> "GameServer":
+        threading.Thread(target=self.serve_forever, name="game-server", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _handler(self):
+        game = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body are written separately, with Nagle every keep-alive answer waits for a delayed ack
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                if path.startswith("/assets/"):
+                    self._respond(200, "", "text/plain")
+                    return
+                game.simulate_work()
+                if path != "/users/sign_in" and not self._signed_in():
+                    self._redirect("/users/sign_in")
+                    return
+                status, body = game.site.render(path)
+                if status == 302:
+                    self._redirect(body)
+                else:
+                    self._respond(status, body)
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                length = int(self.headers.get("Content-Length") or 0)
+                form = parse_form(self.headers.get("Content-Type") or "", self.rfile.read(length))
+                game.simulate_work()
+                if path == "/users/sign_in":
+                    if not form.get("user[email]") or not form.get("user[password]"):
+                        self._redirect("/users/sign_in")
+                        return
+                    token = secrets.token_hex(16)
+                    with game._lock:
+                        game.sessions.add(token)
+                    self._redirect("/", {"Set-Cookie": f"{SESSION_COOKIE}={token}; Path=/; HttpOnly"})
+                    return
+                if not self._signed_in():
+                    self._redirect("/users/sign_in")
+                    return
+                match = re.fullmatch(r"/buildings/(\d+)/personal_count_target", path)
+                if match and "building[personal_count_target]" in form:
+                    game.site.set_target_crew(int(match.group(1)), form["building[personal_count_target]"])
+                    self._redirect(f"/buildings/{game.site.cpr}")
+                    return
+                self._respond(404, "")
+
+            def _signed_in(self) -> bool:
+                cookies = dict(
+                    cookie.strip().split("=", 1) for cookie in (self.headers.get("Cookie") or "").split(";")
+                    if "=" in cookie
+                )
+                with game._lock:
+                    return cookies.get(SESSION_COOKIE) in game.sessions
+
+            def _redirect(self, location: str, headers: Dict[str, str] = None):
+                self._respond(302, "", headers={"Location": location, **(headers or {})})
+
+            def _respond(self, status: int, body: str, content_type: str = "text/html",
+                         headers: Dict[str, str] = None):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def simulate_work(self) -> None:
+        with self._lock:
+            self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+@click.command()
+@click.option("--buildings", "buildings", default=1000, type=click.IntRange(min=1))
+@click.option("--crew", "crew", default=40, type=click.IntRange(min=0))
+@click.option("--vehicles", "vehicles", default=6, type=click.IntRange(min=0))
+@click.option("--categories", "categories", default="JRG", type=click.STRING)
+@click.option("--cpr", "cpr", default=1, type=click.INT)
+@click.option("--seed", "seed", default=0, type=click.INT)
+@click.option("--host", "host", default="127.0.0.1", type=click.STRING)
+@click.option("--port", "port", default=8000, type=click.INT)
+@click.option("--latency-ms", "latency_ms", default=0, type=click.FloatRange(min=0))
+def server(buildings, crew, vehicles, categories, cpr, seed, host, port, latency_ms):
+    categories = tuple(category.strip() for category in categories.split(","))
+    unknown = [category for category in categories if category not in BUILDING_CATEGORIES]
+    if unknown:
+        raise click.BadParameter(f"unknown categories {unknown}, known: {list(BUILDING_CATEGORIES)}")
+    cprint(f"Generating {buildings} buildings...", "cyan")
+    site = SyntheticSite(buildings=buildings, crew=crew, vehicles=vehicles, cpr=cpr, categories=categories, seed=seed)
+    game = GameServer(site, host, port, latency_ms / 1000)
+    cprint(f"Game stand-in on {game.url}, run the builder with GAME_URL={game.url}", "green")
+    try:
+        game.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        cprint(f"Served {game.requests} requests", "cyan")
+        game.close()
+
+
+if __name__ == "__main__":
+    server()
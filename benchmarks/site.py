@@ -0,0 +1,336 @@
+import dataclasses
+import html
+import os
+import random
+import re
+import threading
+from string import Template
+from typing import Dict, List, Optional, Tuple
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+BUILDING_CATEGORIES = {
+    "JRG": "Building_fire",
+    "OPI": "Building_polizeiwache",
+    "OPP": "Building_bereitschaftspolizei",
+    "MEDIC": "Building_rettungswache",
+}
+# (type id, name, cost, catalog tab)
+VEHICLE_TYPES = [
+    (0, "GCBARt", 5000, "Pożarnicze"),
+    (1, "SD", 10000, "Pożarnicze"),
+    (2, "SLOp", 8000, "Pożarnicze"),
+    (3, "SRChem", 12000, "Specjalne"),
+    (4, "SDl", 6000, "Specjalne"),
+    (5, "SCKn", 9000, "Specjalne"),
+    (6, "Przyczepa wielofunkcyjna", 3000, "Przyczepy"),
+    (7, "Kontener powodziowo - pompowy", 4000, "Kontenery"),
+]
+VEHICLE_MAX_CREW = {"GCBARt": 6, "SD": 2, "SLOp": 3, "SRChem": 3, "SDl": 2, "SCKn": 2}
+EDUCATIONS = ["", "", "", "Ratownictwo chemiczne", "Szkolenie w dowodzeniu",
+              "Ratownictwo chemiczne, Szkolenie w dowodzeniu"]
+EXTENSIONS = {
+    "JRG": [("Rozbudowa dla pojazdów proszkowych", 1)] + [("Rozbudowa dla kontenerów", 1)] * 5,
+    "OPI": [
+        ("Rozbudowa o stanowisko dowodzenia", 1),
+        ("Rozbudowa o policyjne więźniarki", 1),
+        ("Rozbudowa o Oddział Prewencji Policji", 1),
+        ("Rozbudowa o Wydział Ruchu Drogowego", 1),
+        ("Cela więzienna", 1),
+    ] + [("Dodatkowa cela", 1)] * 9,
+    "OPP": [("Rozbudowa o stanowisko dowodzenia", 1), ("Rozbudowa o policyjne więźniarki", 1)],
+    "MEDIC": [],
+}
+AVAILABLE = "Dostępne"
+
+
+@dataclasses.dataclass
+class FakeCrewMember:
+    id: int
+    name: str
+    education: str
+    state: str
+    vehicle_id: Optional[int] = None
+
+
+@dataclasses.dataclass
+class FakeVehicle:
+    id: int
+    type_id: int
+    name: str
+
+
+@dataclasses.dataclass
+class FakeBuilding:
+    id: int
+    name: str
+    category: str
+    level: int
+    space: int
+    vehicles: List[FakeVehicle]
+    crew: List[FakeCrewMember]
+    # extension index -> "built", "in_progress" or "to_build"
+    extensions: List[str]
+    recruitment: Optional[str] = None
+    target_crew: int = 0
+
+
+def load_fixture(name: str) -> Template:
+    with open(os.path.join(FIXTURES_DIR, f"{name}.html"), "r", encoding="utf-8") as f:
+        return Template(f.read())
+
+
+class SyntheticSite:
+    """
+    Stateful stand-in of the game pages the bot reads and clicks, rendered from the HTML fixtures.
+    Paths mirror operatorratunkowy.pl, GET of an action path changes the state like a click would.
+    """
+
+    def __init__(self, buildings: int = 10, crew: int = 40, vehicles: int = 6, cpr: int = 1,
+                 categories: Tuple[str, ...] = ("JRG",), seed: int = 0):
+        self.cpr = cpr
+        self.fixtures = {
+            name[:-5]: load_fixture(name[:-5]) for name in os.listdir(FIXTURES_DIR) if name.endswith(".html")
+        }
+        self._lock = threading.RLock()
+        self._ids = iter(range(cpr + 1, 10 ** 9))
+        randomizer = random.Random(seed)
+        self.buildings: Dict[int, FakeBuilding] = {}
+        self.vehicles: Dict[int, Tuple[FakeBuilding, FakeVehicle]] = {}
+        for i in range(buildings):
+            category = categories[i % len(categories)]
+            building = FakeBuilding(
+                id=next(self._ids),
+                name=f"{category} {i + 1:05d}",
+                category=category,
+                level=randomizer.randint(1, 20),
+                space=randomizer.randint(vehicles, vehicles + 6),
+                vehicles=[],
+                crew=[],
+                extensions=[randomizer.choice(["built", "to_build", "to_build"]) for _ in EXTENSIONS[category]],
+                recruitment=randomizer.choice([None, "1 dzień", "Automatycznie"]),
+                target_crew=randomizer.choice([crew, 300]),
+            )
+            self.buildings[building.id] = building
+            for _ in range(vehicles):
+                self._add_vehicle(building, randomizer.choice(VEHICLE_TYPES[:6])[0])
+            for j in range(crew):
+                building.crew.append(FakeCrewMember(
+                    id=next(self._ids),
+                    name=f"Strażak {building.id}-{j + 1}",
+                    education=randomizer.choice(EDUCATIONS),
+                    state=randomizer.choice([AVAILABLE] * 8 + ["W szkole", "Na służbie"]),
+                ))
+            for member in building.crew:
+                free_vehicles = [v for v in building.vehicles if self._assigned(v) < VEHICLE_MAX_CREW.get(v.name, 0)]
+                if free_vehicles and randomizer.random() < 0.5:
+                    member.vehicle_id = randomizer.choice(free_vehicles).id
+
+    def _add_vehicle(self, building: FakeBuilding, type_id: int) -> FakeVehicle:
+        vehicle = FakeVehicle(next(self._ids), type_id, VEHICLE_TYPES[type_id][1])
+        building.vehicles.append(vehicle)
+        self.vehicles[vehicle.id] = (building, vehicle)
+        return vehicle
+
+    def _assigned(self, vehicle: FakeVehicle) -> int:
+        building, _ = self.vehicles[vehicle.id]
+        return sum(1 for member in building.crew if member.vehicle_id == vehicle.id)
+
+    def _page(self, title: str, content: str) -> str:
+        return self.fixtures["layout"].substitute(title=html.escape(title), content=content)
+
+    def render(self, path: str) -> Tuple[int, str]:
+        """Returns status and html of a GET, a redirect is returned as 302 with the location as body."""
+        path = path.split("?")[0].rstrip("/") or "/"
+        with self._lock:
+            for pattern, handler in self.routes():
+                match = re.fullmatch(pattern, path)
+                if match:
+                    return handler(*[int(group) if group.isdigit() else group for group in match.groups()])
+        return 404, self._page("Nie znaleziono", "<h1>404</h1>")
+
+    def routes(self):
+        return [
+            (r"/", self.index),
+            (r"/users/sign_in", self.sign_in),
+            (r"/buildings/(\d+)", self.building),
+            (r"/buildings/(\d+)/personals", self.personals),
+            (r"/buildings/(\d+)/vehicles/new", self.vehicles_new),
+            (r"/buildings/(\d+)/expand_do/credits", self.expand_do),
+            (r"/buildings/(\d+)/extension/credits/(\d+)", self.extension_do),
+            (r"/buildings/(\d+)/hire_do/(\w+)", self.hire_do),
+            (r"/buildings/(\d+)/vehicle/\d+/(\d+)/credits", self.buy_vehicle),
+            (r"/vehicles/(\d+)", self.vehicle),
+            (r"/vehicles/(\d+)/zuweisung", self.zuweisung),
+            (r"/vehicles/(\d+)/zuweisung_add/(\d+)", self.zuweisung_add),
+        ]
+
+    def index(self):
+        return 200, self._page("Operator Ratunkowy", f'<a href="/buildings/{self.cpr}">Budynki</a>')
+
+    def sign_in(self):
+        return 200, self._page("Logowanie", self.fixtures["sign_in"].substitute())
+
+    def building(self, building_id):
+        if building_id == self.cpr:
+            return self.building_list()
+        building = self.buildings.get(building_id)
+        if building is None:
+            return 404, self._page("Nie znaleziono", "<h1>404</h1>")
+        vehicles = "".join(
+            self.fixtures["building_vehicle_row"].substitute(
+                id=vehicle.id, name=html.escape(vehicle.name), crew=self._assigned(vehicle), state="Dostępny",
+            )
+            for vehicle in building.vehicles
+        )
+        extensions = "".join(
+            self.fixtures["extension_row"].substitute(
+                name=html.escape(name),
+                description="",
+                cost="100 000 kredytów",
+                duration=f"{days} dni",
+                actions=self._extension_actions(building, i),
+            )
+            for i, (name, days) in enumerate(EXTENSIONS[building.category])
+        )
+        content = self.fixtures["building"].substitute(
+            name=html.escape(building.name),
+            level=building.level,
+            taken=len(building.vehicles),
+            space=building.space,
+            extensions=extensions,
+            vehicles=vehicles,
+        )
+        return 200, self._page(building.name, content)
+
+    def _extension_actions(self, building: FakeBuilding, index: int) -> str:
+        status = building.extensions[index]
+        if status == "built":
+            return f'<a href="/buildings/{building.id}/extension_ready/{index}" class="btn btn-xs btn-default">Gotowe</a>'
+        if status == "in_progress":
+            return f'Pozostały czas: 5 dni <a href="/buildings/{building.id}/extension_cancel/{index}">Anuluj</a>'
+        return f'<a href="/buildings/{building.id}/extension/credits/{index}" class="btn btn-xs btn-success">Rozbuduj</a>'
+
+    def building_list(self):
+        rows = []
+        for building in self.buildings.values():
+            if building.recruitment:
+                recruitment = html.escape(building.recruitment)
+            else:
+                recruitment = self.fixtures["recruitment_links"].substitute(id=building.id).strip()
+            rows.append(self.fixtures["building_list_row"].substitute(
+                category=BUILDING_CATEGORIES[building.category],
+                id=building.id,
+                name=html.escape(building.name),
+                level=building.level,
+                recruitment=recruitment,
+                crew=len(building.crew),
+                target_crew=building.target_crew,
+                vehicles=len(building.vehicles),
+            ))
+        content = self.fixtures["building_list"].substitute(
+            name=f"Centrum Powiadamiania Ratunkowego {self.cpr}", count=len(self.buildings), rows="".join(rows),
+        )
+        return 200, self._page("Budynki", content)
+
+    def personals(self, building_id):
+        building = self.buildings[building_id]
+        rows = []
+        for member in building.crew:
+            assigned = ""
+            if member.vehicle_id:
+                _, vehicle = self.vehicles[member.vehicle_id]
+                assigned = f'<a href="/vehicles/{vehicle.id}">{html.escape(vehicle.name)}</a>'
+            rows.append(self.fixtures["personal_row"].substitute(
+                id=member.id,
+                name=html.escape(member.name),
+                education=html.escape(member.education),
+                assigned=assigned,
+                state=member.state,
+            ))
+        content = self.fixtures["personals"].substitute(name=html.escape(building.name), rows="".join(rows))
+        return 200, self._page(building.name, content)
+
+    def vehicles_new(self, building_id):
+        building = self.buildings[building_id]
+        tabs = list(dict.fromkeys(tab for _, _, _, tab in VEHICLE_TYPES))
+        tab_links = "\n".join(f'  <li><a href="#tab_{i}">{html.escape(tab)}</a></li>' for i, tab in enumerate(tabs))
+        panes = []
+        for i, tab in enumerate(tabs):
+            cards = "".join(
+                self.fixtures["vehicle_type"].substitute(
+                    name=html.escape(name), type_id=type_id, building_id=building.id, cost=cost,
+                )
+                for type_id, name, cost, vehicle_tab in VEHICLE_TYPES if vehicle_tab == tab
+            )
+            style = "" if i == 0 else ' style="display: none"'
+            panes.append(f'<div class="tab-pane" id="tab_{i}"{style}>\n{cards}</div>')
+        content = self.fixtures["vehicles_new"].substitute(
+            name=html.escape(building.name), tabs=tab_links, panes="\n".join(panes),
+        )
+        return 200, self._page(building.name, content)
+
+    def vehicle(self, vehicle_id):
+        building, vehicle = self.vehicles[vehicle_id]
+        return 200, self._page(vehicle.name, f"<h1>{html.escape(vehicle.name)}</h1>")
+
+    def zuweisung(self, vehicle_id):
+        building, vehicle = self.vehicles[vehicle_id]
+        rows = []
+        for member in building.crew:
+            if member.vehicle_id == vehicle.id:
+                action = f'<a href="/vehicles/{vehicle.id}/zuweisung_remove/{member.id}" class="btn btn-danger">Usuń</a>'
+            elif member.vehicle_id:
+                action = "W innym pojeździe"
+            else:
+                action = (
+                    f'<a href="/vehicles/{vehicle.id}/zuweisung_add/{member.id}" class="btn btn-success">'
+                    f'Przydziel pojazd</a>'
+                )
+            rows.append(self.fixtures["zuweisung_row"].substitute(
+                name=html.escape(member.name), education=html.escape(member.education), state=member.state,
+                action=action,
+            ))
+        content = self.fixtures["zuweisung"].substitute(
+            name=html.escape(vehicle.name),
+            assigned=self._assigned(vehicle),
+            max_crew=VEHICLE_MAX_CREW.get(vehicle.name, 0),
+            rows="".join(rows),
+        )
+        return 200, self._page(vehicle.name, content)
+
+    # actions
+
+    def zuweisung_add(self, vehicle_id, member_id):
+        building, vehicle = self.vehicles[vehicle_id]
+        for member in building.crew:
+            if member.id == member_id and member.vehicle_id is None:
+                member.vehicle_id = vehicle.id
+        return 302, f"/vehicles/{vehicle_id}/zuweisung"
+
+    def expand_do(self, building_id):
+        # like in the game, an extension is the next level with one more place
+        self.buildings[building_id].level += 1
+        self.buildings[building_id].space += 1
+        return 302, f"/buildings/{building_id}"
+
+    def extension_do(self, building_id, index):
+        building = self.buildings[building_id]
+        if building.extensions[index] == "to_build":
+            building.extensions[index] = "in_progress"
+        return 302, f"/buildings/{building_id}"
+
+    def hire_do(self, building_id, level):
+        self.buildings[building_id].recruitment = "Automatycznie" if level == "automatic" else f"{level} dni"
+        return 302, f"/buildings/{self.cpr}"
+
+    def buy_vehicle(self, building_id, type_id):
+        building = self.buildings[building_id]
+        if len(building.vehicles) < building.space or VEHICLE_TYPES[type_id][1].startswith("Kontener"):
+            self._add_vehicle(building, type_id)
+        return 302, f"/buildings/{building_id}"
+
+    def set_target_crew(self, building_id, target_crew):
+        with self._lock:
+            self.buildings[building_id].target_crew = int(target_crew)
@@ -1,16 +1,18 @@
-import time
 from configparser import ConfigParser, SectionProxy
 from contextlib import suppress
 from enum import Enum
-from typing import Optional
+from typing import Optional, List, Tuple, TYPE_CHECKING
 
 from builder_const import Building, Config, BuildingCategory, BUILDING_BASE_URL
-from selenium.common import NoSuchElementException
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webelement import WebElement
+from http_reader import HttpReader
+from instrumentation import timed_phase
+from page_cache import PAGE_CACHE, expansions_key
 from termcolor import cprint
-from utils import do_click, get_table_rows
+from utils import do_click, get_table_data, TableCell, fetch_all
+from waits import wait_until, table_present
+
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
 
 
 class ExpansionStatus(Enum):
@@ -33,23 +35,75 @@ class Expansions(str, Enum):
     containers = "Rozbudowa dla kontenerów"
 
 
-def build_expansions(driver: WebDriver, building: Building, config: Config) -> None:
-    driver.get(f"{BUILDING_BASE_URL}{building.id}")
+@timed_phase("build_expansions")
+def build_expansions(driver: "WebDriver", building: Building, config: Config, reader: Optional[HttpReader] = None) -> None:
+    to_build = get_expansions_to_build(driver, building, config, reader)
+    if sum(to_build.values()) > 0:
+        # without the reader the expansions tab is already open
+        queue_building_expansions(driver, building, to_build, open_tab=reader is not None)
+
+
+@timed_phase("get_expansions_to_build")
+def get_expansions_to_build(driver: "WebDriver", building: Building, config: Config,
+                            reader: Optional[HttpReader] = None) -> dict:
+    if not config.ini.has_section(building.category.name):
+        cprint(f'No [{building.category.name}] expansions section in config.ini, skipping. {building}', 'yellow')
+        return {}
     expansions_target_raw = config.ini[building.category.name]
     expansions_target = {k: _get_expansion_target_value(v) for k, v in expansions_target_raw.items()}
 
-    do_click(driver, driver.find_element(By.XPATH, '//*[@id="tabs"]/li[2]/a'))
-    time.sleep(0.3)
-
-    current_expansions = get_expansions_status(driver)
+    if reader:
+        rows = PAGE_CACHE.get(building, expansions_key(building))
+        if rows is None:
+            rows = reader.get(f"{BUILDING_BASE_URL}{building.id}").table_data(class_name="table")
+            PAGE_CACHE.put(building, expansions_key(building), rows)
+    else:
+        # the tab is left open for queueing, so the browser always reads it
+        _open_expansions_tab(driver, building)
+        rows = get_table_data(driver, class_name="table")
+
+    current_expansions = get_expansions_status(rows)
     cprint(f'Current: {current_expansions}, target: {expansions_target}', 'yellow')
     to_build = {k: max(0, v - current_expansions.get(k, 0)) for k, v in expansions_target.items()}
     cprint(f'To build: {to_build}', 'yellow')
+    return to_build
+
+
+@timed_phase("queue_building_expansions")
+def queue_building_expansions(driver: "WebDriver", building: Building, to_build: dict, open_tab: bool = True) -> None:
+    if open_tab:
+        # queueing is done by clicking, so the page has to be open in the browser
+        _open_expansions_tab(driver, building)
+
+    rows = get_table_data(driver, class_name="table")
+    expected = get_expansions_status(rows)
+    links = get_expansion_links(rows, to_build)
+    # every link navigates, clicked one after another they cancel each other. Sent as requests from the page
+    # one at a time, each is finished before the next one starts
+    results = fetch_all(driver, [{"url": href, "data": None} for _, href in links], concurrency=1)
+    for (expansion, _), queued in zip(links, results):
+        if queued:
+            expected[expansion.name] = expected.get(expansion.name, 0) + 1
+            cprint(f'Expansion was queued {expansion}', 'green')
+        else:
+            cprint(f'Cant queue {expansion}', 'red')
+    # queued expansions start building, vehicles and space stay as they are
+    PAGE_CACHE.invalidate(building, expansions_key(building))
 
-    while sum(to_build.values()) > 0:
-        result = queue_expansions(driver, to_build)
-        if not result:
-            break
+    # verified once, on the table loaded again after all the requests
+    _open_expansions_tab(driver, building)
+    current = get_expansions_status(get_table_data(driver, class_name="table"))
+    for name, count in expected.items():
+        if current.get(name, 0) < count:
+            cprint(f'Expected {count} of {name} built or in progress, got {current.get(name, 0)}. {building}', 'red')
+
+
+def _open_expansions_tab(driver: "WebDriver", building: Building) -> None:
+    from selenium.webdriver.common.by import By
+
+    driver.get(f"{BUILDING_BASE_URL}{building.id}")
+    do_click(driver, driver.find_element(By.XPATH, '//*[@id="tabs"]/li[2]/a'))
+    wait_until(driver, table_present(class_name="table"), "expansions table")
 
 
 def _get_expansion_target_value(value: str) -> int:
@@ -60,18 +114,19 @@ def _get_expansion_target_value(value: str) -> int:
     return int(value)
 
 
-def _get_expansion(name: WebElement) -> Optional[Expansions]:
+def _get_expansion(name: TableCell) -> Optional[Expansions]:
+    if name.bold is None:
+        return None
     with suppress(ValueError):
-        parsed = name.find_element(By.TAG_NAME, 'b').get_attribute('innerHTML').strip()
-        expansions = Expansions(parsed)
+        expansions = Expansions(name.bold.strip())
         if expansions == Expansions.prison_cell_n or expansions == expansions.prison_cell_1:
             return Expansions.prison_cells
     return None
 
 
-def _get_status(actions: WebElement) -> ExpansionStatus:
-    try:
-        action_href = actions.find_element(By.TAG_NAME, 'a').get_attribute('href')
+def _get_status(actions: TableCell) -> ExpansionStatus:
+    action_href = actions.href
+    if action_href:
         if 'extension_cancel' in action_href:
             return ExpansionStatus.in_progress
         if 'extension_finish' in action_href:
@@ -80,23 +135,16 @@ def _get_status(actions: WebElement) -> ExpansionStatus:
             return ExpansionStatus.done
         if 'extension/credits' in action_href:
             return ExpansionStatus.to_build
-    except NoSuchElementException:
-        if "Pozostały czas" in actions.text:
-            return ExpansionStatus.in_progress
 
-    try:
-        if "Pozostały czas" in actions.get_attribute('text'):
-            return ExpansionStatus.in_progress
-    except Exception as err:
-        pass
+    if "Pozostały czas" in actions.text:
+        return ExpansionStatus.in_progress
     return ExpansionStatus.waiting_other
 
 
-def get_expansions_status(driver: WebDriver) -> dict:
-    rows = get_table_rows(driver, class_name="table")
+def get_expansions_status(rows: List[List[TableCell]]) -> dict:
     already_built = {}
     for row in rows:
-        name, _, _, actions = row.find_elements(By.TAG_NAME, 'td')
+        name, _, _, actions = row
         expansion = _get_expansion(name)
         if not expansion:
             continue
@@ -108,21 +156,17 @@ def get_expansions_status(driver: WebDriver) -> dict:
     return already_built
 
 
-def queue_expansions(driver: WebDriver, to_build: dict) -> bool:
-    rows = get_table_rows(driver, class_name="table")
+def get_expansion_links(rows: List[List[TableCell]], to_build: dict) -> List[Tuple[Expansions, str]]:
+    """Action links of the expansions to queue, in table order, as many of each as still to build."""
+    to_build = dict(to_build)
+    links = []
     for row in rows:
-        name, _, _, actions = row.find_elements(By.TAG_NAME, 'td')
+        name, _, _, actions = row
         expansion = _get_expansion(name)
-        print(name, expansion)
         if not expansion:
             continue
 
-        expansion_status = _get_status(actions)
-        print(expansion_status, to_build.get(expansion.name), actions.text)
-        if expansion_status is ExpansionStatus.to_build and to_build.get(expansion.name, 0) > 0:
-            to_build[expansion.name] = to_build[expansion.name] - 1
-            do_click(driver, actions.find_element(By.TAG_NAME, 'a'))
-            cprint(f'Expansion was queued {expansion}', 'green')
-            return True
-
-    return False
+        if _get_status(actions) is ExpansionStatus.to_build and to_build.get(expansion.name, 0) > 0:
+            to_build[expansion.name] -= 1
+            links.append((expansion, actions.href))
+    return links
@@ -1,54 +1,110 @@
+import cProfile
 import dataclasses
 import enum
+import itertools
 import json
 import os
+import pstats
 import sys
+import threading
 import time
 import traceback
 from configparser import ConfigParser
+from collections import Counter
+from contextlib import suppress
 from copy import copy
-from typing import Optional, List, Tuple
-from datetime import datetime
+from typing import Optional, List, Tuple, Dict
+from datetime import datetime, timedelta
+from queue import Queue, Empty
 
 import click
 import click_config_file
-from build_expansions import build_expansions
+from action_plan import ActionPlan, Action, ActionKind
+from build_expansions import build_expansions, get_expansions_to_build, queue_building_expansions
 from builder_const import BuildingCategory, Building, CrewMember, Vehicle, VehicleCategory, VehicleTarget, Config, \
-    BUILDING_BASE_URL, VEHICLE_BASE_URL
+    BUILDING_BASE_URL, VEHICLE_BASE_URL, education_set
 from termcolor import cprint
-from utils import init_and_log_in, do_click, get_path, get_config, normalize, printProgressBar, get_table_rows
-from selenium.webdriver.common.by import By
+from crew_planner import plan_crew_assignment
+from daemon import DaemonStatus, StatusServer, schedule
+from fleet_analytics import FleetAnalysis
+from http_reader import HttpReader
+from page_cache import PAGE_CACHE, details_url, personals_url, expansions_key
+from prefetch import PrefetchingReader, building_read_urls, invalidate
+from instrumentation import METRICS, InstrumentedDriver, timed_phase
+from rate_limit import RateLimiter, RateLimitedDriver
+from run_journal import RunJournal, JournalStep
+from state_store import StateStore
+from vehicle_catalog import VehicleCatalog
+from waits import wait_until, table_present, page_replaced, text_changed, WAIT_STATS
+from utils import init_and_log_in, do_click, get_path, get_config, normalize_text, printProgressBar, get_table_data, \
+    href_id, click_href, fetch_all
 
 
-def get_list_of_buildings(driver, cpr, building_category=BuildingCategory.JRG):
-    driver.get(f"{BUILDING_BASE_URL}{cpr}")
-    do_click(driver, driver.find_element(By.XPATH, '//*[@id="tabs"]/li[4]/a'))
-    time.sleep(2)
-    buildings = list(get_table_rows(driver, "building_table"))
+BUILDING_CATEGORIES = {category.value: category for category in BuildingCategory}
+
+
+@dataclasses.dataclass
+class RunContext:
+    store: StateStore
+    catalog: VehicleCatalog
+    reader: Optional[HttpReader] = None
+    journal: Optional[RunJournal] = None
+    # config of each processed building category, with its own builder schema
+    configs: Dict[BuildingCategory, Config] = dataclasses.field(default_factory=dict)
+
+    def config_for(self, building: Building, config: Config) -> Config:
+        return self.configs.get(building.category, config)
+
+
+def get_list_of_buildings(driver, cpr, building_category=BuildingCategory.JRG, reader: Optional[HttpReader] = None):
+    return [building for building in get_all_buildings(driver, cpr, reader) if building.category is building_category]
+
+
+def list_fingerprint(level, crew, vehicles) -> str:
+    """Columns of the building list row that change with the building, compared between passes."""
+    return f"{level}|{crew}|{vehicles}"
+
+
+@timed_phase("get_all_buildings")
+def get_all_buildings(driver, cpr, reader: Optional[HttpReader] = None) -> List[Building]:
+    """Parses the building list once, every building of a known category."""
+    if reader:
+        buildings = reader.get(f"{BUILDING_BASE_URL}{cpr}").table_data("building_table")
+    else:
+        from selenium.webdriver.common.by import By
+
+        driver.get(f"{BUILDING_BASE_URL}{cpr}")
+        do_click(driver, driver.find_element(By.XPATH, '//*[@id="tabs"]/li[4]/a'))
+        wait_until(driver, table_present("building_table"), "building list")
+        buildings = get_table_data(driver, "building_table")
 
     parsed_buildings = list()
     l = len(buildings)
     printProgressBar(0, l, prefix="Parsing buildings data:", suffix="Complete", length=50)
     for i, building in enumerate(buildings):
-        building_type, name, level, _, crew, _, _ = list(building.find_elements(By.TAG_NAME, "td"))
-        building_type = building_type.find_element(By.TAG_NAME, "img").get_attribute("alt")
-        if building_type == building_category.value:
-            building_id = (
-                name.find_element(By.TAG_NAME, "a").get_attribute("href").split("/")[-1:][0]
-            )
+        building_type, name, level, recruitment, crew, target_crew, vehicles = building
+        building_category = next(
+            (BUILDING_CATEGORIES[alt] for alt in building_type.img_alts if alt in BUILDING_CATEGORIES), None,
+        )
+        if building_category is not None:
             parsed_buildings.append(
                 Building(
-                    building_id,
+                    href_id(name.href),
                     name.text.strip(),
                     cpr,
                     building_category,
-                    int(normalize(level)),
-                    int(normalize(crew)),
+                    int(level.normalized),
+                    int(crew.normalized),
                     None,
                     None,
                     list(),
                     list(),
                     None,
+                    fingerprint=list_fingerprint(level.normalized, crew.normalized, vehicles.normalized),
+                    recruitment=recruitment.normalized,
+                    target_crew=target_crew.normalized,
+                    recruitment_hrefs=recruitment.hrefs,
+                    target_crew_url=target_crew.form_actions[0] if target_crew.form_actions else None,
                 )
             )
         printProgressBar(i+1, l, prefix="Parsing buildings data:", suffix="Complete", length=50)
@@ -56,52 +112,93 @@ def get_list_of_buildings(driver, cpr, building_category=BuildingCategory.JRG):
     return parsed_buildings
 
 
-def get_building_details(driver, building):
-    driver.get(f"{BUILDING_BASE_URL}{building.id}")
-
-    space_details = driver.find_element(
-        By.XPATH, '//*[@id="iframe-inside-container"]/dl/dd[2]'
-    ).text.split(" ")
-    space_taken = int(space_details[0].strip())
-    space_available = int(space_details[2].strip())
-    building.free_space = space_available - space_taken
-    building.vehicles_number = space_taken
+@timed_phase("get_building_details")
+def get_building_details(driver, building, reader: Optional[HttpReader] = None):
+    url = details_url(building)
+    snapshot = PAGE_CACHE.get(building, url)
+    if snapshot is None:
+        if reader:
+            page = reader.get(url)
+            details = page.find_by_id("iframe-inside-container").children_by_tag("dl")[0]
+            space_details = details.children_by_tag("dd")[1].text.split(" ")
+            vehicles = page.table_data("vehicle_table")
+            # same page, build_expansions does not have to read it again
+            PAGE_CACHE.put(building, expansions_key(building), page.table_data(class_name="table"))
+        else:
+            from selenium.webdriver.common.by import By
+
+            driver.get(url)
+            space_details = driver.find_element(
+                By.XPATH, '//*[@id="iframe-inside-container"]/dl/dd[2]'
+            ).text.split(" ")
+            vehicles = get_table_data(driver, "vehicle_table")
+
+        space_taken = int(space_details[0].strip())
+        space_available = int(space_details[2].strip())
+        vehicles_parsed = tuple(
+            Vehicle(normalize_text(vehicle[1].link_texts[0]), href_id(vehicle[1].href)) for vehicle in vehicles
+        )
+        snapshot = (space_available - space_taken, space_taken, vehicles_parsed)
+        PAGE_CACHE.put(building, url, snapshot)
 
-    vehicles = get_table_rows(driver, "vehicle_table")
-    vehicles_parsed = list()
-    for vehicle in vehicles:
-        a = list(vehicle.find_elements(By.TAG_NAME, "td"))[1].find_element(By.TAG_NAME, "a")
-        vehicles_parsed.append(Vehicle(normalize(a), a.get_attribute("href").split("/")[-1:][0]))
-    building.vehicles = vehicles_parsed
+    building.free_space, building.vehicles_number, vehicles_parsed = snapshot
+    building.vehicles = list(vehicles_parsed)
 
 
-def buy_vehicles(driver, building, to_buy):
-    driver.get(f"{BUILDING_BASE_URL}{building.id}/vehicles/new")
+@timed_phase("buy_vehicles")
+def buy_vehicles(driver, building, to_buy, catalog: VehicleCatalog, journal: Optional[RunJournal] = None):
+    url = f"{BUILDING_BASE_URL}{building.id}/vehicles/new"
+    driver.get(url)
+    links = catalog.links(driver, building)
     for car, count in to_buy.items():
+        link = links.get(car)
+        if not link:
+            cprint(f'{car} not found in vehicle catalog', 'red')
+            continue
         for _ in range(0, count):
-            time.sleep(0.3)
-            vehicle = _find_vehicle(driver, car)
-            if vehicle:
-                cprint(f'BUYING {car}', 'green')
-                do_click(driver, vehicle)
-
-
-def get_crew_members(driver, building):
-    driver.get(f"{BUILDING_BASE_URL}{building.id}/personals")
-
-    crew_members = get_table_rows(driver, "personal_table")
+            if not click_href(driver, link):
+                # buying moved the browser away from the catalog
+                driver.get(url)
+                if not click_href(driver, link):
+                    cprint(f'Cant buy {car}', 'red')
+                    break
+            cprint(f'BUYING {car}', 'green')
+            PAGE_CACHE.invalidate(building, details_url(building))
+            if journal:
+                journal.record(building, JournalStep.bought_vehicle, vehicle=car)
+            # the next click on the catalog being left could cancel this purchase or make another one
+            if not wait_until(driver, page_replaced, "vehicle bought", required=False):
+                cprint(f'Cant confirm {car} was bought, not buying more of it', 'red')
+                break
+
+
+@timed_phase("get_crew_members")
+def get_crew_members(driver, building, reader: Optional[HttpReader] = None):
+    url = personals_url(building)
+    snapshot = PAGE_CACHE.get(building, url)
+    if snapshot is not None:
+        building.crew_members, building.available_crew = list(snapshot[0]), snapshot[1]
+        return building.crew_members
+
+    if reader:
+        crew_members = reader.get(url).table_data("personal_table")
+    else:
+        driver.get(url)
+        crew_members = get_table_data(driver, "personal_table")
     crew_members_parsed = list()
     available_crew = 0
     for crew_member in crew_members:
-        name, education, assigned, state, _ = list(crew_member.find_elements(By.TAG_NAME, "td"))
-        assigned_n = normalize(assigned)
-        state_n = normalize(state)
+        name, education, assigned, state, _ = crew_member
+        # states and vehicle names repeat in every building, one shared string each
+        assigned_n = sys.intern(assigned.normalized)
+        state_n = sys.intern(state.normalized)
         crew_member_parsed = CrewMember(
             name=name.text.strip(),
-            education=frozenset(normalize(education).split(",")),
+            education=education_set(education.normalized.split(",")),
             assigned=assigned_n,
             state=state_n,
             available=state_n == "Dostepne" and assigned_n == "",
+            assigned_vehicle_id=href_id(assigned.href) if assigned.href else None,
         )
         crew_members_parsed.append(crew_member_parsed)
         if crew_member_parsed.available:
@@ -109,19 +206,10 @@ def get_crew_members(driver, building):
 
     building.crew_members = crew_members_parsed
     building.available_crew = available_crew
+    PAGE_CACHE.put(building, url, (tuple(crew_members_parsed), available_crew))
     return crew_members_parsed
 
 
-def _find_vehicle(driver, vehicle_name):
-    vehicle_tabs = driver.find_elements(By.XPATH, '//*[@id="tabs"]/li/a')
-    for tab in vehicle_tabs:
-        do_click(driver, tab)
-        time.sleep(0.2)
-        for vehicle in driver.find_elements(By.CLASS_NAME, "vehicle_type"):
-            if normalize(vehicle.find_element(By.TAG_NAME, "h3")) == vehicle_name:
-                return list(vehicle.find_elements(By.TAG_NAME, "a"))[1]
-
-
 def check_what_to_buy(building, to_buy):
     cars_to_buy = {k: t.count for k, t in to_buy.items()}
     current_cars = {}
@@ -133,45 +221,112 @@ def check_what_to_buy(building, to_buy):
     return {k: c for k, c in missing.items() if c > 0}
 
 
-def expand_building(driver, building, space):
+@timed_phase("expand_building")
+def expand_building(driver, building, space, reader: Optional[HttpReader] = None,
+                    journal: Optional[RunJournal] = None):
     for _ in range(0, space):
-        driver.get(f"{BUILDING_BASE_URL}{building.id}/expand_do/credits")
-        time.sleep(0.2)
-
-
-def assign_crew_to_vehicles(driver, building: Building, config: Config) -> None:
-    vehicles_keys = config.builder_schema.keys()
-    for vehicle in building.vehicles:
-        if vehicle.name in vehicles_keys:
-            assign_crew(driver, vehicle, config.builder_schema[vehicle.name], config.dry_run)
-
+        url = f"{BUILDING_BASE_URL}{building.id}/expand_do/credits"
+        if reader:
+            reader.request(url)
+        else:
+            driver.get(url)
+        # every extension is the next level of the building
+        building.level += 1
+        PAGE_CACHE.invalidate(building, details_url(building))
+        if journal:
+            journal.record(building, JournalStep.extended)
+
+
+@timed_phase("assign_crew_to_vehicles")
+def assign_crew_to_vehicles(driver, building: Building, config: Config, reader: Optional[HttpReader] = None,
+                            fresh_crew: bool = False) -> bool:
+    """
+    `fresh_crew` tells the personnel page was read in this pass. Only then its counts are trusted and the counter
+    of assignment pages is not read, crew from the state store or the journal can be assigned since.
+    Returns True when crew was assigned.
+    """
+    plan = plan_crew_assignment(building, config.builder_schema)
+    if not plan:
+        print(f"No need to assign {building}")
+        return False
+
+    for assignment in plan:
+        if assignment.missing:
+            cprint(
+                f"Missing {assignment.missing} crew with education {assignment.target.education_f} "
+                f"for {assignment.vehicle}",
+                'red',
+            )
 
-def assign_crew(driver, vehicle, vehicle_target_data, dry_run):
+    assigned = False
+    for assignment in plan:
+        if not assignment.to_assign:
+            continue
+        if config.dry_run:
+            cprint(f"Would assign {assignment.to_assign} to {assignment.vehicle}", 'yellow')
+            continue
+        assign_crew(
+            driver, assignment.vehicle, assignment.target, config.dry_run, reader, assignment.to_assign,
+            assignment.assigned if fresh_crew else None,
+        )
+        PAGE_CACHE.invalidate(building, personals_url(building))
+        assigned = True
+    return assigned
+
+
+@timed_phase("assign_crew")
+def assign_crew(driver, vehicle, vehicle_target_data, dry_run, reader: Optional[HttpReader] = None,
+                limit: Optional[int] = None, assigned: Optional[int] = None):
+    """
+    `assigned` is the crew count of the vehicle from a fresh personnel snapshot, with it the counter
+    of the assignment page is not read first and only the browser opens the page, to click.
+    """
     if vehicle_target_data.crew == 0:
         return
 
-    driver.get(f"{VEHICLE_BASE_URL}{vehicle.id}/zuweisung")
-    time.sleep(0.3)
-    assigned = int(driver.find_element(By.ID, "count_personal").text.strip())
+    url = f"{VEHICLE_BASE_URL}{vehicle.id}/zuweisung"
+    page = None
+    opened = False
+    if assigned is None:
+        if reader:
+            page = reader.get(url)
+            assigned = int(page.find_by_id("count_personal").text.strip())
+        else:
+            from selenium.webdriver.common.by import By
+
+            driver.get(url)
+            opened = True
+            assigned = int(driver.find_element(By.ID, "count_personal").text.strip())
     want_to_assign = vehicle_target_data.crew
     target_education = vehicle_target_data.education_f
     if assigned < want_to_assign:
         to_assign = want_to_assign - assigned
-        personal_table = get_table_rows(driver, "personal_table")
+        if limit is not None:
+            to_assign = min(to_assign, limit)
+        if reader and dry_run:
+            personal_table = (page or reader.get(url)).table_data("personal_table")
+        else:
+            if not opened:
+                # assigning is done by JavaScript, so only now the page is opened in the browser
+                driver.get(url)
+            personal_table = get_table_data(driver, "personal_table")
+        count_text = str(assigned)
         cprint(f"Trying to assign {to_assign}, education: {target_education}. {vehicle}", 'yellow')
         for person in personal_table:
             if to_assign <= 0:
                 cprint("Done", 'green')
                 return
 
-            _, education, state, assign = list(person.find_elements(By.TAG_NAME, "td"))
-            education = frozenset(normalize(education).split(','))
-            state = normalize(state)
-            assigned = normalize(assign) != "Przydziel pojazd"
-            if education == target_education and state == "Dostepne" and not assigned:
+            _, education, state, assign = person
+            education = education_set(education.normalized.split(','))
+            state = state.normalized
+            assigned = assign.normalized != "Przydziel pojazd"
+            if education is target_education and state == "Dostepne" and not assigned:
                 if not dry_run:
-                    do_click(driver, assign.find_element(By.TAG_NAME, "a"))
-                    time.sleep(0.3)
+                    click_href(driver, assign.href)
+                    count_text = wait_until(
+                        driver, text_changed("count_personal", count_text), "assigned crew counter", required=False,
+                    ) or count_text
                 to_assign -= 1
         if to_assign > 0:
             cprint(f'Cant assign all crew {vehicle}', 'red')
@@ -188,8 +343,9 @@ def check_is_crew_available(building: Building, target_to_buy, to_buy) -> Tuple[
 
     needed_crew_education_names = set(needed_crew_education.keys())
     not_available_crew = set()
+    available_crew = Counter(member.education for member in building.crew_members if member.available)
     for education, count in needed_crew_education.items():
-        available = sum([1 for member in building.crew_members if member.education == education and member.available])
+        available = available_crew[education]
         if available < count:
             cprint(f"Missing {education}. Available: {available}, needed: {count}", 'red')
             not_available_crew.add(education)
@@ -215,6 +371,36 @@ def _get_vehicle_target(config: dict) -> VehicleTarget:
     return VehicleTarget(count=config['count'], crew=0, education=None, category=VehicleCategory[config['category']])
 
 
+def _parse_building_categories(value: str) -> List[BuildingCategory]:
+    if value.strip().upper() == 'ALL':
+        return list(BuildingCategory)
+    return [BuildingCategory[name.strip()] for name in value.split(',') if name.strip()]
+
+
+def _category_configs(config: Config, categories) -> Dict[BuildingCategory, Config]:
+    """
+    Config of every category, with the builder schema from the [BUILDER_SCHEMAS] section if it has one.
+    builder_schema serves JRG and a category run on its own, other categories without a schema are left out,
+    vehicles and space of the fire brigade schema are not theirs.
+    """
+    schema_files = config.ini['BUILDER_SCHEMAS'] if config.ini.has_section('BUILDER_SCHEMAS') else {}
+    schemas = {config.builder_schema_file: config.builder_schema}
+    configs = {}
+    for category in categories:
+        schema_file = schema_files.get(category.name)
+        if schema_file is None and (category is BuildingCategory.JRG or len(categories) == 1):
+            schema_file = config.builder_schema_file
+        if schema_file is None:
+            cprint(f'No builder schema for {category.name} in [BUILDER_SCHEMAS] of config.ini, skipping it.', 'yellow')
+            continue
+        if schema_file not in schemas:
+            schemas[schema_file] = _get_builder_schema(schema_file)
+        configs[category] = dataclasses.replace(
+            config, building_category=category, builder_schema_file=schema_file, builder_schema=schemas[schema_file],
+        )
+    return configs
+
+
 def _get_config(file_path, cmd_name):
     return get_config()['BUILDER']
 
@@ -227,13 +413,14 @@ def filter_to_buy_by_available_education(
     }
 
 
-def buy_needed_vehicles(driver, building, builder_schema, dry_run):
+def plan_vehicle_purchases(building, builder_schema) -> Tuple[dict, int]:
+    """Returns vehicles to buy and the number of places the building has to be extended by."""
     cprint(f'Analyzing vehicles... {building}', 'yellow')
     to_buy = check_what_to_buy(building, builder_schema)
 
     if not to_buy:
         cprint(f"Nothing to buy.", 'green')
-        return
+        return {}, 0
     cprint(f"NEED to buy: {to_buy} {building}", 'yellow')
 
     is_crew_available, available_education = check_is_crew_available(
@@ -244,7 +431,7 @@ def buy_needed_vehicles(driver, building, builder_schema, dry_run):
             f"NOT ENOUGH crew, skipping buying new vehicles... {building}",
             'red'
         )
-        return
+        return {}, 0
     if is_crew_available:
         cprint(f"Got all required crew. {building}", 'green')
     else:
@@ -252,19 +439,36 @@ def buy_needed_vehicles(driver, building, builder_schema, dry_run):
         to_buy = filter_to_buy_by_available_education(available_education, builder_schema, to_buy)
         cprint(f"Will perform partial buying: {to_buy} {building}", 'yellow')
 
-    needed_space = sum([
-        count for key, count in to_buy.items() if builder_schema[key].category is not VehicleCategory.container
-    ])
+    needed_space = _needed_space(to_buy, builder_schema)
     free_space = building.free_space
     if building.category is BuildingCategory.OPI:
         free_space -= 3
     if needed_space > free_space:
+        return to_buy, max(0, needed_space - building.free_space)
+    return to_buy, 0
+
+
+def _needed_space(to_buy: dict, builder_schema) -> int:
+    return sum([
+        count for key, count in to_buy.items() if builder_schema[key].category is not VehicleCategory.container
+    ])
+
+
+def buy_needed_vehicles(driver, building, builder_schema, dry_run, catalog: VehicleCatalog,
+                        reader: Optional[HttpReader] = None, journal: Optional[RunJournal] = None) -> bool:
+    to_buy, space = plan_vehicle_purchases(building, builder_schema)
+    if not to_buy:
+        return False
+
+    if space:
         cprint(f"NEED MORE space, extending building... {building}", 'yellow')
         if not dry_run:
-            expand_building(driver, building, needed_space - building.free_space)
+            expand_building(driver, building, space, reader, journal)
 
     if not dry_run:
-        buy_vehicles(driver, building, to_buy)
+        buy_vehicles(driver, building, to_buy, catalog, journal)
+        return True
+    return False
 
 
 def filter_buildings(config: Config, buildings: List[Building]) -> List[Building]:
@@ -294,47 +498,248 @@ def _can_apply_building(config: Config, building: Building) -> bool:
     return all(checks)
 
 
-def set_recruitment(driver, buildings: List[Building], config: Config) -> None:
-    cprint('Loading building list for setting recruitment...', 'yellow')
-    driver.get(f"{BUILDING_BASE_URL}{config.cpr}")
-    do_click(driver, driver.find_element(By.XPATH, '//*[@id="tabs"]/li[4]/a'))
-    time.sleep(2)
-    buildings_table = list(get_table_rows(driver, "building_table"))
+def _get_recruitment_settings(config: Config) -> Tuple[int, str]:
     try:
         recruitment_level = int(config.ini['RECRUITMENT']['duration'])
     except ValueError:
         recruitment_level = 4
-    target_crew = config.ini['RECRUITMENT']['target_crew']
+    return recruitment_level, config.ini['RECRUITMENT']['target_crew']
+
+
+def plan_recruitment(buildings: List[Building], config: Config) -> List[Action]:
+    recruitment_level, target_crew = _get_recruitment_settings(config)
+    actions = []
+    for building in buildings:
+        if building.recruitment is not None and "Brak" in building.recruitment:
+            href = building.recruitment_hrefs[recruitment_level - 1] \
+                if len(building.recruitment_hrefs) >= recruitment_level else None
+            actions.append(_action(ActionKind.recruit, building, level=recruitment_level, href=href))
+        if building.target_crew is not None and building.target_crew != target_crew:
+            actions.append(_action(
+                ActionKind.target_crew, building, target_crew=target_crew, url=building.target_crew_url,
+                form_page=f"{BUILDING_BASE_URL}{building.cpr}",
+            ))
+    return actions
+
+
+def set_recruitment(driver, buildings: List[Building], config: Config) -> None:
+    apply_recruitment(driver, plan_recruitment(buildings, config), config.dry_run)
+
+
+RECRUITMENT_BATCH = 20
+
+
+@timed_phase("apply_recruitment")
+def apply_recruitment(driver, actions: List[Action], dry_run: bool) -> None:
+    """Sends the recruitment and crew target changes as direct requests, in batches, without opening the list."""
+    requests = []
+    for action in actions:
+        if action.kind is ActionKind.recruit:
+            cprint(f'Would like to set recruitment level {action.payload["level"]} for {action.building_name}', 'yellow')
+            request = {"url": action.payload.get("href"), "data": None}
+        else:
+            cprint(f'Would like to set target crew {action.payload["target_crew"]} for {action.building_name}', 'yellow')
+            request = {
+                "url": action.payload.get("url"),
+                "data": {"building[personal_count_target]": action.payload["target_crew"]},
+                "form_page": action.payload.get("form_page"),
+            }
+        if request["url"]:
+            requests.append((action, request))
+        else:
+            cprint(f'No link for {action.kind.value} on the building list for {action.building_name}', 'red')
+    if dry_run or not requests:
+        cprint(f'Recruitment done', 'green')
+        return
+
+    from selenium.common.exceptions import WebDriverException
 
-    building_ids = [building.id for building in buildings]
-    for building in buildings_table:
-        _, name, _, recruitment, _, set_target_crew, _ = list(building.find_elements(By.TAG_NAME, "td"))
-        building_id = (
-            name.find_element(By.TAG_NAME, "a").get_attribute("href").split("/")[-1:][0]
+    failed = 0
+    for i in range(0, len(requests), RECRUITMENT_BATCH):
+        batch = requests[i:i + RECRUITMENT_BATCH]
+        try:
+            results = fetch_all(driver, [request for _, request in batch])
+        except WebDriverException as e:
+            cprint(f'Batch of {len(batch)} recruitment changes failed: {e.msg}', 'yellow')
+            results = [False] * len(batch)
+        for (action, _), succeeded in zip(batch, results):
+            if not succeeded:
+                failed += 1
+                cprint(f'Failed to set {action.kind.value} for {action.building_name}', 'red')
+    cprint(f'Recruitment done, {len(requests) - failed} of {len(requests)} changes applied', 'green')
+
+
+def _action(kind: ActionKind, building: Building, **payload) -> Action:
+    return Action(kind, building.id, building.name, building.category.name, payload)
+
+
+def _load_building(driver, building: Building, config: Config, context: RunContext) -> bool:
+    """Loads crew and vehicles of the building, returns True when they came from the state store or the journal."""
+    journal = context.journal
+    if journal and journal.restore(building):
+        cprint(f'Resuming, using crew and vehicles from the run journal. {building}', 'green')
+        return True
+    from_store = config.incremental and context.store.load(building)
+    if from_store:
+        cprint(f'Unchanged since last pass, using stored crew and vehicles. {building}', 'green')
+    else:
+        get_crew_members(driver, building, context.reader)
+        get_building_details(driver, building, context.reader)
+    if journal:
+        journal.record_loaded(building)
+    return from_store
+
+
+def make_plan(driver, buildings: List[Building], config: Config, context: RunContext) -> ActionPlan:
+    actions = []
+    if not config.dont_recruit:
+        actions.extend(plan_recruitment(buildings, config))
+
+    buildings_len = len(buildings)
+    for i, building in enumerate(buildings, start=1):
+        cprint(f'----- PLANNING {building}, {i} of {buildings_len} -----', 'magenta')
+        building_config = context.config_for(building, config)
+        try:
+            with METRICS.phase("plan_building", building):
+                _load_building(driver, building, building_config, context)
+                to_buy = {}
+                if not building_config.dont_buy:
+                    to_buy, space = plan_vehicle_purchases(building, building_config.builder_schema)
+                    if space:
+                        actions.append(_action(ActionKind.extend_space, building, space=space))
+                    if to_buy:
+                        actions.append(_action(ActionKind.buy, building, vehicles=to_buy))
+                if not building_config.dont_assign:
+                    for assignment in plan_crew_assignment(building, building_config.builder_schema):
+                        if assignment.to_assign:
+                            actions.append(_action(
+                                ActionKind.assign, building, vehicle_id=assignment.vehicle.id,
+                                vehicle_name=assignment.vehicle.name, count=assignment.to_assign,
+                            ))
+                    if to_buy:
+                        actions.append(_action(ActionKind.assign_bought, building))
+                if not building_config.dont_build_expansions:
+                    to_build = get_expansions_to_build(driver, building, building_config, context.reader)
+                    if sum(to_build.values()) > 0:
+                        actions.append(_action(
+                            ActionKind.expansion, building, to_build={k: v for k, v in to_build.items() if v > 0},
+                        ))
+        except Exception as err:
+            cprint(f"Error while planning {building}, it is left out of the plan", 'red')
+            cprint(str(err), 'red')
+        finally:
+            PAGE_CACHE.invalidate(building)
+
+    return ActionPlan(cpr=str(config.cpr), actions=actions)
+
+
+def analyze_fleet(driver, buildings: List[Building], config: Config, context: RunContext) -> FleetAnalysis:
+    buildings_len = len(buildings)
+    loaded = []
+    for i, building in enumerate(buildings, start=1):
+        cprint(f'----- LOADING {building}, {i} of {buildings_len} -----', 'magenta')
+        try:
+            _load_building(driver, building, context.config_for(building, config), context)
+            loaded.append(building)
+        except Exception as err:
+            cprint(f"Error while loading {building}, it is left out of the analysis", 'red')
+            cprint(str(err), 'red')
+        finally:
+            PAGE_CACHE.invalidate(building)
+
+    analysis = FleetAnalysis(loaded, lambda building: context.config_for(building, config).builder_schema)
+    analysis.save(get_path(config.analytics_out))
+    totals = analysis.totals()
+    cprint(f'Analysis of {totals["buildings"]} buildings saved into {config.analytics_out}', 'green')
+    cprint(f'Space needed: {totals["space_needed"]} in {totals["buildings_needing_space"]} buildings', 'cyan')
+    for name, count in totals["missing_vehicles"].items():
+        cprint(f'Missing {name}: {count}', 'cyan')
+    for education, count in totals["crew_shortfall"].items():
+        buildings_short = totals["buildings_short_of_crew"][education]
+        cprint(f'Crew shortfall {education}: {count} in {buildings_short} buildings', 'red' if count else 'green')
+    return analysis
+
+
+def _remaining_purchases(building: Building, actions: List[Action], builder_schema) -> dict:
+    """Vehicles of the buy action of the building it still misses, by the vehicles read last."""
+    planned = next((action.payload["vehicles"] for action in actions if action.kind is ActionKind.buy), {})
+    missing = check_what_to_buy(building, builder_schema)
+    return {car: min(count, missing[car]) for car, count in planned.items() if missing.get(car, 0) > 0}
+
+
+def execute_plan(driver, plan: ActionPlan, config: Config, context: RunContext) -> None:
+    for kind, count in plan.summary().items():
+        cprint(f'{kind}: {count}', 'cyan')
+    if config.dry_run:
+        for action in plan.actions:
+            cprint(f'Would {action}', 'yellow')
+        return
+
+    apply_recruitment(driver, plan.of_kinds(ActionKind.recruit, ActionKind.target_crew), False)
+
+    planned_buildings = plan.by_building()
+    buildings_len = len(planned_buildings)
+    for i, actions in enumerate(planned_buildings.values(), start=1):
+        first = actions[0]
+        building = Building(
+            first.building_id, first.building_name, plan.cpr, BuildingCategory[first.category],
+            0, 0, None, None, list(), list(), None,
         )
-        if building_id in building_ids:
-            if "Brak" in normalize(recruitment):
-                cprint(f'Would like to set recruitment level {recruitment_level} for {name.text.strip()}', 'yellow')
-                if not config.dry_run:
-                    do_click(driver, recruitment.find_element(By.XPATH, f'./div/a[{recruitment_level}]'))
-                    time.sleep(0.3)
-                    cprint(f'Recruitment level set {recruitment_level} for {name.text.strip()}', 'green')
-            if normalize(set_target_crew) != target_crew:
-                cprint(f'Would like to set target crew {target_crew} for {name.text.strip()}', 'yellow')
-                if not config.dry_run:
-                    try:
-                        do_click(driver, set_target_crew.find_element(By.CLASS_NAME, 'personal_count_target_edit_button'))
-                        time.sleep(0.3)
-                        input = set_target_crew.find_element(By.ID, 'building_personal_count_target')
-                        input.clear()
-                        input.send_keys(target_crew)
-                        do_click(driver, set_target_crew.find_element(By.CLASS_NAME, 'btn-success'))
-                        time.sleep(0.3)
-                        cprint(f'Set crew target {target_crew} for {name.text.strip()}', 'green')
-                    except Exception:
-                        driver.save_screenshot(f"recruitment_error.png")
-                        raise
-    cprint(f'Recruitment done', 'green')
+        cprint(f'----- EXECUTING PLAN FOR {building}, {i} of {buildings_len} -----', 'magenta')
+        if building.category not in context.configs:
+            cprint(f'No builder schema for {building.category.name}, skipping. {building}', 'yellow')
+            continue
+        building_config = context.config_for(building, config)
+        # the plan may have been run already, every action is cut down to what the building still misses
+        PAGE_CACHE.invalidate(building)
+        try:
+            with METRICS.phase("execute_building", building):
+                to_buy = {}
+                if any(action.kind in (ActionKind.extend_space, ActionKind.buy) for action in actions):
+                    get_building_details(driver, building, context.reader)
+                    to_buy = _remaining_purchases(building, actions, building_config.builder_schema)
+                for action in actions:
+                    cprint(str(action), 'yellow')
+                    if action.kind is ActionKind.extend_space:
+                        space = min(
+                            action.payload["space"],
+                            max(0, _needed_space(to_buy, building_config.builder_schema) - building.free_space),
+                        )
+                        if space:
+                            expand_building(driver, building, space, context.reader)
+                        else:
+                            cprint(f'Building has the space already, not extending. {building}', 'green')
+                    elif action.kind is ActionKind.buy:
+                        if to_buy:
+                            buy_vehicles(driver, building, to_buy, context.catalog)
+                        else:
+                            cprint(f'Building has the vehicles already, not buying. {building}', 'green')
+                    elif action.kind is ActionKind.assign:
+                        vehicle = Vehicle(action.payload["vehicle_name"], action.payload["vehicle_id"])
+                        assign_crew(
+                            driver, vehicle, building_config.builder_schema[vehicle.name], False, context.reader,
+                            action.payload["count"],
+                        )
+                        PAGE_CACHE.invalidate(building, personals_url(building))
+                    elif action.kind is ActionKind.assign_bought:
+                        get_crew_members(driver, building, context.reader)
+                        get_building_details(driver, building, context.reader)
+                        assign_crew_to_vehicles(driver, building, building_config, context.reader, fresh_crew=True)
+                    elif action.kind is ActionKind.expansion:
+                        missing = get_expansions_to_build(driver, building, building_config, context.reader)
+                        to_build = {
+                            name: min(count, missing.get(name, 0))
+                            for name, count in action.payload["to_build"].items() if missing.get(name, 0) > 0
+                        }
+                        if to_build:
+                            # without the reader the expansions tab is already open
+                            queue_building_expansions(driver, building, to_build, open_tab=context.reader is not None)
+                        else:
+                            cprint(f'Expansions are built or in progress already, not queueing. {building}', 'green')
+        except Exception as err:
+            _save_error(driver, building, err, 'error')
+        finally:
+            PAGE_CACHE.invalidate(building)
 
 
 @click.command()
@@ -353,75 +758,380 @@ def set_recruitment(driver, buildings: List[Building], config: Config) -> None:
 @click.option("--level-min", "level_min", default=0, type=click.INT)
 @click.option("--level-max", "level_max", default=0, type=click.INT)
 @click.option("--building-category", "building_category", type=click.STRING, default='JRG')
+@click.option("--http-reads", "http_reads", default=False, is_flag=True, type=click.BOOL)
+@click.option("--prefetch", "prefetch", default=0, type=click.IntRange(min=0))
+@click.option("--workers", "workers", default=1, type=click.IntRange(min=1))
+@click.option("--max-rps", "max_rps", default=0, type=click.FLOAT)
+@click.option("--retries", "retries", default=3, type=click.IntRange(min=0))
+@click.option("--slow-response", "slow_response", default=5, type=click.FloatRange(min=0))
+@click.option("--incremental", "incremental", default=False, is_flag=True, type=click.BOOL)
+@click.option("--state-file", "state_file", type=click.STRING, default='builder_state.sqlite3')
+@click.option("--catalog-max-age", "catalog_max_age", default=24, type=click.FLOAT)
+@click.option("--analytics-out", "analytics_out", type=click.STRING, default=None)
+@click.option("--plan-out", "plan_out", type=click.STRING, default=None)
+@click.option("--execute-plan", "execute_plan", type=click.STRING, default=None)
+@click.option("--browser-profile", "browser_profile", type=click.STRING, default=None)
+@click.option("--lean-browser", "lean_browser", default=None, type=click.BOOL)
+@click.option("--daemon", "daemon", default=False, is_flag=True, type=click.BOOL)
+@click.option("--interval", "interval", default=15, type=click.FloatRange(min=0))
+@click.option("--recheck-hours", "recheck_hours", default=24, type=click.FloatRange(min=0))
+@click.option("--status-port", "status_port", default=0, type=click.IntRange(min=0))
+@click.option("--resume", "resume", default=False, is_flag=True, type=click.BOOL)
+@click.option("--journal-file", "journal_file", type=click.STRING, default='builder_journal.jsonl')
+@click.option("--metrics-out", "metrics_out", type=click.STRING, default=None)
+@click.option("--prometheus-out", "prometheus_out", type=click.STRING, default=None)
+@click.option("--profile", "profile_out", type=click.STRING, default=None)
 @click_config_file.configuration_option(provider=_get_config)
 def builder(**kwargs):
-    building_category = BuildingCategory[kwargs.pop('building_category')]
+    building_categories = _parse_building_categories(kwargs.pop('building_category'))
     builder_schema_file = kwargs.pop('builder_schema')
+    store = StateStore(get_path(kwargs.pop('state_file')))
+    journal = RunJournal(get_path(kwargs.pop('journal_file')))
+    catalog = VehicleCatalog(get_path('vehicle_catalog.json'), kwargs.pop('catalog_max_age'))
+    metrics_out = kwargs.pop('metrics_out')
+    prometheus_out = kwargs.pop('prometheus_out')
+    profile_out = kwargs.pop('profile_out')
     config = Config(
         **kwargs,
-        building_category=building_category,
+        building_category=building_categories[0],
+        building_categories=building_categories,
         ini=get_config(),
         builder_schema_file=builder_schema_file,
         builder_schema=_get_builder_schema(builder_schema_file),
     )
 
-    driver = init_and_log_in(config.headless)
-    all_buildings = get_list_of_buildings(driver, config.cpr, config.building_category)
-    cprint(f'Loaded {len(all_buildings)} of type {config.building_category.name}', 'green')
+    profiler = cProfile.Profile() if profile_out else None
+    if profiler:
+        profiler.enable()
+    try:
+        run_builder(config, store, catalog, journal)
+    finally:
+        journal.close()
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(get_path(profile_out))
+            pstats.Stats(profiler).sort_stats(pstats.SortKey.CUMULATIVE).print_stats(20)
+            cprint(f'Profile saved into {profile_out}', 'cyan')
+        WAIT_STATS.report()
+        METRICS.report()
+        if metrics_out:
+            METRICS.save_json(get_path(metrics_out))
+            cprint(f'Metrics saved into {metrics_out}', 'cyan')
+        if prometheus_out:
+            METRICS.save_prometheus(get_path(prometheus_out))
+            cprint(f'Prometheus metrics saved into {prometheus_out}', 'cyan')
+
+
+def start_browser(config: Config, worker: int = 1) -> InstrumentedDriver:
+    lean = config.headless if config.lean_browser is None else config.lean_browser
+    if lean:
+        cprint('Lean browser: images, fonts, media and map tiles are blocked, pages load eagerly.', 'cyan')
+    # a Chrome profile can be used by one browser at a time
+    profile_dir = None
+    if config.browser_profile:
+        profile_dir = get_path(config.browser_profile if worker == 1 else f'{config.browser_profile}_w{worker}')
+    driver = init_and_log_in(config.headless, page_load="eager" if lean else None, lean=lean, profile_dir=profile_dir)
+    return InstrumentedDriver(driver)
+
+
+def run_builder(config: Config, store: StateStore, catalog: VehicleCatalog, journal: RunJournal) -> None:
+    if config.resume:
+        if config.dry_run:
+            cprint('Dry run cannot be resumed.', 'red')
+            return
+        if not journal.resume():
+            cprint(f'No run to resume in {journal.path}', 'red')
+            return
+        if journal.run["cpr"] != str(config.cpr):
+            cprint(f'Last run in {journal.path} was for CPR {journal.run["cpr"]}, not {config.cpr}', 'red')
+            return
+
+    rate_limiter = RateLimiter(config.max_rps, config.retries, config.slow_response)
+    driver = RateLimitedDriver(start_browser(config), rate_limiter)
+    reader = HttpReader.from_driver(driver, rate_limiter=rate_limiter) if config.http_reads else None
+    context = RunContext(store=store, catalog=catalog, reader=reader)
+
+    if config.daemon:
+        context.configs = _category_configs(config, config.building_categories)
+        run_daemon(driver, config, context, rate_limiter)
+        return
 
-    buildings = filter_buildings(config, all_buildings)
-    cprint(f'Filtered buildings {len(buildings)}', 'green')
+    if config.execute_plan:
+        cprint(f'Executing plan {config.execute_plan}...', 'cyan')
+        plan = ActionPlan.load(get_path(config.execute_plan))
+        context.configs = _category_configs(config, {BuildingCategory[action.category] for action in plan.actions})
+        execute_plan(driver, plan, config, context)
+        return
+
+    if config.resume:
+        buildings = journal.pending_buildings()
+        cprint(
+            f'Resuming run started {journal.run["started_at"]}: {len(buildings)} of '
+            f'{len(journal.run["buildings"])} buildings left',
+            'green',
+        )
+        context.configs = _category_configs(config, {building.category for building in buildings})
+        buildings = [building for building in buildings if building.category in context.configs]
+    else:
+        context.configs = _category_configs(config, config.building_categories)
+        buildings = select_buildings(driver, config, context)
+
+    if config.analytics_out:
+        analyze_fleet(driver, buildings, config, context)
+        return
+
+    if config.plan_out:
+        plan = make_plan(driver, buildings, config, context)
+        plan.save(get_path(config.plan_out))
+        cprint(f'Plan with {len(plan.actions)} actions saved into {config.plan_out}', 'green')
+        for kind, count in plan.summary().items():
+            cprint(f'{kind}: {count}', 'cyan')
+        return
 
     if config.dry_run:
         cprint("Running in dry-run mode.", 'red')
-
-    if not config.dont_recruit:
-        set_recruitment(driver, buildings, config)
     else:
+        if not config.resume:
+            journal.start(config.cpr, config.building_categories, buildings)
+        context.journal = journal
+
+    if config.dont_recruit:
         cprint('Skipping recruitment process.', 'yellow')
+    elif context.journal and context.journal.has(None, JournalStep.recruitment):
+        cprint('Recruitment was already set in this run.', 'green')
+    else:
+        set_recruitment(driver, buildings, config)
+        if context.journal:
+            context.journal.record(None, JournalStep.recruitment)
 
+    if config.workers > 1:
+        if config.prefetch:
+            cprint('Prefetching works with a single worker, it is off.', 'yellow')
+        run_workers(driver, buildings, config, rate_limiter, context)
+        return
+
+    if config.prefetch and not reader:
+        cprint('Prefetching needs --http-reads, it is off.', 'yellow')
+    elif config.prefetch:
+        # buildings served from the journal or the state store are not read at all
+        def read_urls(building: Building) -> List[str]:
+            if context.journal and context.journal.has(building, JournalStep.loaded):
+                return []
+            if config.incremental and store.is_unchanged(building):
+                return []
+            return building_read_urls(building)
+
+        fetch_reader = HttpReader.from_driver(driver, rate_limiter=rate_limiter)
+        context.reader = PrefetchingReader(reader, fetch_reader, buildings, config.prefetch, read_urls).start()
+    try:
+        buildings_len = len(buildings)
+        for i, building in enumerate(buildings, start=1):
+            process_building(driver, building, config, context, f'{i} of {buildings_len}')
+            if isinstance(context.reader, PrefetchingReader):
+                context.reader.release(building)
+    finally:
+        if isinstance(context.reader, PrefetchingReader):
+            context.reader.close()
+
+
+def select_buildings(driver, config: Config, context: RunContext) -> List[Building]:
+    """Reads the building list once and filters it for every category of the run."""
+    all_buildings = get_all_buildings(driver, config.cpr, context.reader)
+    buildings = []
+    for category in config.building_categories:
+        if category not in context.configs:
+            continue
+        category_buildings = [building for building in all_buildings if building.category is category]
+        cprint(f'Loaded {len(category_buildings)} of type {category.name}', 'green')
+        category_buildings = filter_buildings(context.configs[category], category_buildings)
+        cprint(f'Filtered buildings {len(category_buildings)}', 'green')
+        buildings.extend(category_buildings)
+    return buildings
+
+
+def run_daemon(driver, config: Config, context: RunContext, rate_limiter: RateLimiter) -> None:
+    """
+    Keeps the browser session and rescans the building list every `interval` minutes. Only buildings
+    changed since their last pass in the state store are processed, new and failed ones first.
+    """
+    if config.dry_run:
+        cprint('Dry run does not save state, every building is processed in every cycle.', 'yellow')
+    status = DaemonStatus()
+    server = StatusServer(config.status_port, status).start() if config.status_port else None
+    try:
+        while True:
+            status.scanning()
+            # pages read in the last cycle are outdated by now
+            PAGE_CACHE.clear()
+            try:
+                buildings = select_buildings(driver, config, context)
+                queue = schedule(buildings, context.store, config.recheck_hours)
+                status.scheduled(len(buildings), queue)
+                reasons = Counter(reason.name for _, reason in queue)
+                cprint(
+                    f'Cycle {status.cycle}: {len(queue)} of {len(buildings)} buildings changed {dict(reasons)}', 'cyan',
+                )
+                if queue and not config.dont_recruit:
+                    set_recruitment(driver, buildings, config)
+                for i, (building, reason) in enumerate(queue, start=1):
+                    status.working_on(building, reason)
+                    succeeded = process_building(
+                        driver, building, config, context, f'{i} of {len(queue)}, {reason.name}',
+                    )
+                    status.finished(succeeded)
+            except Exception as err:
+                # most likely the session or the browser is gone, start over with a new one
+                cprint(f'Cycle {status.cycle} failed: {err}', 'red')
+                traceback.print_exc()
+                status.error(err)
+                with suppress(Exception):
+                    driver.quit()
+                try:
+                    driver = RateLimitedDriver(start_browser(config), rate_limiter)
+                    if config.http_reads:
+                        context.reader = HttpReader.from_driver(driver, rate_limiter=rate_limiter)
+                except Exception as restart_err:
+                    # the game or the browser is still down, the next cycle fails and tries again
+                    cprint(f'Browser restart failed: {restart_err}', 'red')
+                    status.error(restart_err)
+
+            next_scan_at = datetime.now() + timedelta(minutes=config.interval)
+            status.sleeping(next_scan_at)
+            cprint(f'Next scan at {next_scan_at:%H:%M:%S}', 'cyan')
+            time.sleep(config.interval * 60)
+    finally:
+        if server:
+            server.close()
+
+
+@timed_phase("process_building")
+def process_building(driver, building: Building, config: Config, context: RunContext, progress: str,
+                     error_prefix: str = 'error') -> bool:
+    reader, store, journal = context.reader, context.store, context.journal
+    config = context.config_for(building, config)
+    text = f'----- WORKING ON {building} crew: {building.crew}, {progress} -----'
+    cprint('-'*len(text), 'magenta')
+    cprint(text, 'magenta')
+    cprint('-' * len(text), 'magenta')
+    try:
+        from_store = _load_building(driver, building, config, context)
+
+        # buy cars - check needed cars and needed crew
+        bought = False
+        if config.dont_buy:
+            cprint('Skipping vehicles checks.', 'yellow')
+        elif journal and journal.has(building, JournalStep.bought):
+            cprint(f'Vehicles were already bought in this run. {building}', 'green')
+        else:
+            bought = buy_needed_vehicles(
+                driver, building, config.builder_schema, config.dry_run, context.catalog, reader, journal,
+            )
+            if bought:
+                # new vehicles and maybe a bigger building, pages read ahead are outdated
+                invalidate(reader, building)
+            if journal:
+                journal.record(building, JournalStep.bought)
+
+        assigned = False
+        if config.dont_assign:
+            cprint('Skipping assigning crew.', 'yellow')
+        elif journal and journal.has(building, JournalStep.assigned):
+            cprint(f'Crew was already assigned in this run. {building}', 'green')
+            # after the crew in the journal was read
+            assigned = True
+        else:
+            cprint(f'Assigning crew... {building}', 'yellow')
+            # refresh details to get new vehicles list
+            if bought or not from_store:
+                get_building_details(driver, building, reader)
+
+            # assign crew
+            assigned = assign_crew_to_vehicles(driver, building, config, reader, fresh_crew=not from_store)
+            if not config.dry_run:
+                invalidate(reader, building)
+            if journal:
+                journal.record(building, JournalStep.assigned)
+
+        if config.dont_build_expansions:
+            cprint('Skipping building expansion.', 'yellow')
+        elif journal and journal.has(building, JournalStep.expansions):
+            cprint(f'Expansions were already queued in this run. {building}', 'green')
+        else:
+            cprint(f'Analyzing expansions... {building}', 'yellow')
+            build_expansions(driver, building, config, reader)
+            if not config.dry_run:
+                # the details page read ahead shows the expansions table from before queueing
+                invalidate(reader, building)
+            if journal:
+                journal.record(building, JournalStep.expansions)
+        if not config.dry_run:
+            # the store keeps the building as this pass left it, crew and vehicles read before the actions are outdated
+            if assigned:
+                get_crew_members(driver, building, reader)
+            if bought:
+                get_building_details(driver, building, reader)
+                # as the building list shows it now, a daemon would take the purchase for a change otherwise
+                building.fingerprint = list_fingerprint(building.level, building.crew, len(building.vehicles))
+            store.save(building)
+        if journal:
+            journal.record(building, JournalStep.done)
+        return True
+    except Exception as err:
+        store.mark_failed(building)
+        _save_error(driver, building, err, error_prefix)
+        return False
+    finally:
+        PAGE_CACHE.invalidate(building)
+
+
+def _save_error(driver, building: Building, err: Exception, error_prefix: str) -> None:
+    file = get_path(f'{error_prefix}_{building.id}_{datetime.now().strftime("%d%m%Y%H%M%S")}')
+    driver.save_screenshot(f"{file}.png")
+    cprint(f"Error in {building}", 'red')
+    cprint(str(err), 'red')
+    with open(f"{file}.txt", "w+") as f:
+        f.write(str(dataclasses.asdict(building)))
+        f.write(str(err))
+        f.write(traceback.format_exc())
+    cprint(f'Logs were saved into {file} png and txt file', 'red')
+
+
+def run_workers(driver, buildings: List[Building], config: Config, rate_limiter: RateLimiter,
+                context: RunContext) -> None:
+    cprint(f'Starting {config.workers} workers...', 'cyan')
+    drivers = [driver] + [
+        RateLimitedDriver(start_browser(config, worker), rate_limiter) for worker in range(2, config.workers + 1)
+    ]
+    queue = Queue()
+    for building in buildings:
+        queue.put(building)
     buildings_len = len(buildings)
-    for i, building in enumerate(buildings, start=1):
-        text = f'----- WORKING ON {building} crew: {building.crew}, {i} of {buildings_len} -----'
-        cprint('-'*len(text), 'magenta')
-        cprint(text, 'magenta')
-        cprint('-' * len(text), 'magenta')
-        try:
-            get_crew_members(driver, building)
-            get_building_details(driver, building)
-
-            # buy cars - check needed cars and needed crew
-            if not config.dont_buy:
-                buy_needed_vehicles(driver, building, config.builder_schema, config.dry_run)
-            else:
-                cprint('Skipping vehicles checks.', 'yellow')
-
-            if not config.dont_assign:
-                cprint(f'Assigning crew... {building}', 'yellow')
-                # refresh details to get new vehicles list
-                get_building_details(driver, building)
-
-                # assign crew
-                assign_crew_to_vehicles(driver, building, config)
-            else:
-                cprint('Skipping assigning crew.', 'yellow')
-
-            if not config.dont_build_expansions:
-                cprint(f'Analyzing expansions... {building}', 'yellow')
-                build_expansions(driver, building, config)
-            else:
-                cprint('Skipping building expansion.', 'yellow')
-        except Exception as err:
-            file = get_path(f'error_{building.id}_{datetime.now().strftime("%d%m%Y%H%M%S")}')
-            driver.save_screenshot(f"{file}.png")
-            cprint(f"Error in {building}", 'red')
-            cprint(str(err), 'red')
-            with open(f"{file}.txt", "w+") as f:
-                f.write(str(dataclasses.asdict(building)))
-                f.write(str(err))
-                f.write(traceback.format_exc())
-            cprint(f'Logs were saved into {file} png and txt file', 'red')
+    done = itertools.count(1)
+
+    def work(worker: int, worker_driver) -> None:
+        reader = HttpReader.from_driver(worker_driver, rate_limiter=rate_limiter) if config.http_reads else None
+        worker_context = dataclasses.replace(context, reader=reader)
+        while True:
+            try:
+                building = queue.get_nowait()
+            except Empty:
+                return
+            progress = f'{next(done)} of {buildings_len}, worker {worker}'
+            process_building(worker_driver, building, config, worker_context, progress, f'error_w{worker}')
+
+    threads = [
+        threading.Thread(target=work, args=(worker, worker_driver), name=f'worker-{worker}')
+        for worker, worker_driver in enumerate(drivers, start=1)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for worker_driver in drivers[1:]:
+        worker_driver.quit()
 
 
 if getattr(sys, 'frozen', False):
     builder(sys.argv[1:])
+elif __name__ == "__main__":
+    builder()
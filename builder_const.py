@@ -1,11 +1,14 @@
 import dataclasses
 import enum
+import os
 from configparser import ConfigParser
-from typing import Optional
+from typing import Optional, List, Dict, Iterable
 
 
-BUILDING_BASE_URL = "https://www.operatorratunkowy.pl/buildings/"
-VEHICLE_BASE_URL = "https://www.operatorratunkowy.pl/vehicles/"
+# another server can be set in the environment, e.g. the stand-in of benchmarks/server.py
+GAME_URL = os.environ.get("GAME_URL", "https://www.operatorratunkowy.pl").rstrip("/")
+BUILDING_BASE_URL = f"{GAME_URL}/buildings/"
+VEHICLE_BASE_URL = f"{GAME_URL}/vehicles/"
 
 
 class BuildingCategory(str, enum.Enum):
@@ -18,6 +21,32 @@ class BuildingCategory(str, enum.Enum):
     JRG = "Building_fire"
 
 
+def slotted(cls):
+    """
+    Rebuilds a dataclass with __slots__ for its fields, like dataclass(slots=True) of Python 3.10.
+    Instances take a fraction of the memory of a __dict__ per object, which counts with 300 crew per building.
+    """
+    names = tuple(field.name for field in dataclasses.fields(cls))
+    cls_dict = {
+        key: value for key, value in cls.__dict__.items() if key not in names + ('__dict__', '__weakref__')
+    }
+    cls_dict['__slots__'] = names
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+_EDUCATIONS: Dict[frozenset, frozenset] = {}
+
+
+def education_set(names: Iterable[str]) -> frozenset:
+    """
+    Shared frozenset of education names: equal sets are the same object, so crew members do not each
+    carry their own copy and comparing with a vehicle target education is an identity check.
+    """
+    education = frozenset(names)
+    return _EDUCATIONS.setdefault(education, education)
+
+
+@slotted
 @dataclasses.dataclass
 class Building:
     id: str
@@ -31,11 +60,20 @@ class Building:
     vehicles: list
     crew_members: list
     available_crew: Optional[int]
+    # level, crew and vehicles columns of the building list, used by incremental runs
+    fingerprint: Optional[str] = None
+    # recruitment and target crew columns of the building list
+    recruitment: Optional[str] = None
+    target_crew: Optional[str] = None
+    # links of the recruitment durations and the crew target form, to change them without clicking
+    recruitment_hrefs: list = dataclasses.field(default_factory=list)
+    target_crew_url: Optional[str] = None
 
     def __str__(self):
         return f"{self.name} ({self.id})"
 
 
+@slotted
 @dataclasses.dataclass
 class CrewMember:
     name: str
@@ -43,8 +81,10 @@ class CrewMember:
     assigned: str
     state: str
     available: bool
+    assigned_vehicle_id: Optional[str] = None
 
 
+@slotted
 @dataclasses.dataclass
 class Vehicle:
     name: str
@@ -60,16 +100,18 @@ class VehicleCategory(enum.Enum):
     container = 2
 
 
+@slotted
 @dataclasses.dataclass
 class VehicleTarget:
     count: int
     crew: int
     education: Optional[list]
     category: VehicleCategory
+    # shared set of the education, compared with crew members for every vehicle of every building
+    education_f: frozenset = dataclasses.field(init=False, repr=False, compare=False)
 
-    @property
-    def education_f(self):
-        return frozenset(self.education or [''])
+    def __post_init__(self):
+        self.education_f = education_set(self.education or [''])
 
 
 @dataclasses.dataclass
@@ -90,4 +132,31 @@ class Config:
     dont_recruit: bool
     dont_build_expansions: bool
     building_category: BuildingCategory
+    building_categories: List[BuildingCategory]
+    http_reads: bool
+    workers: int
+    max_rps: float
+    # retries of page loads failing with a timeout or a connection error
+    retries: int
+    # seconds, slower page loads make the requests spaced out, 0 -> off
+    slow_response: float
+    # buildings read ahead in the background with http_reads, 0 -> off
+    prefetch: int
+    incremental: bool
+    plan_out: Optional[str]
+    # CSV or JSON file with vehicle, crew and space needs of the fleet
+    analytics_out: Optional[str]
+    execute_plan: Optional[str]
+    resume: bool
+    daemon: bool
+    # minutes between building list scans of the daemon
+    interval: float
+    # hours after which the daemon processes an unchanged building again, 0 -> never
+    recheck_hours: float
+    # local HTTP status endpoint of the daemon, 0 -> off
+    status_port: int
+    # None -> lean when headless
+    lean_browser: Optional[bool]
+    # Chrome user data directory, separate for every account
+    browser_profile: Optional[str]
     ini: ConfigParser
@@ -0,0 +1,41 @@
+import dataclasses
+from collections import Counter
+from typing import List
+
+from builder_const import Building, Vehicle, VehicleTarget
+
+
+@dataclasses.dataclass
+class CrewAssignment:
+    vehicle: Vehicle
+    target: VehicleTarget
+    assigned: int
+    to_assign: int
+    missing: int
+
+
+def count_assigned_crew(building: Building) -> Counter:
+    return Counter(member.assigned_vehicle_id for member in building.crew_members if member.assigned_vehicle_id)
+
+
+def plan_crew_assignment(building: Building, builder_schema: dict) -> List[CrewAssignment]:
+    """
+    Splits the available crew of the building between its under-crewed schema vehicles,
+    each person counted once. Works on the personnel snapshot only, no page is visited.
+    """
+    assigned_crew = count_assigned_crew(building)
+    free_crew = Counter(member.education for member in building.crew_members if member.available)
+
+    plan = []
+    for vehicle in building.vehicles:
+        target = builder_schema.get(vehicle.name)
+        if target is None or target.crew == 0:
+            continue
+        assigned = assigned_crew[vehicle.id]
+        needed = max(0, target.crew - assigned)
+        if needed == 0:
+            continue
+        to_assign = min(needed, free_crew[target.education_f])
+        free_crew[target.education_f] -= to_assign
+        plan.append(CrewAssignment(vehicle, target, assigned, to_assign, needed - to_assign))
+    return plan
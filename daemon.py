@@ -0,0 +1,167 @@
+import enum
+import json
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+
+from termcolor import cprint
+
+from builder_const import Building
+from instrumentation import METRICS
+from state_store import StateStore
+
+
+class ChangeReason(enum.IntEnum):
+    """Why a building is scheduled in a daemon cycle, lower values are processed first."""
+    new = 0
+    failed = 1
+    level_up = 2
+    crew = 3
+    vehicles = 4
+    # expansions finishing and similar changes are not visible on the building list
+    stale = 5
+
+
+def schedule(buildings: List[Building], store: StateStore, recheck_hours: float) -> List[Tuple[Building, ChangeReason]]:
+    """Buildings changed since their last pass, most important changes first."""
+    last_passes = store.last_passes()
+    recheck_before = datetime.now() - timedelta(hours=recheck_hours) if recheck_hours else None
+    scheduled = []
+    for building in buildings:
+        reason = _change_reason(building, last_passes.get(str(building.id)), recheck_before)
+        if reason is not None:
+            scheduled.append((building, reason))
+    # sort is stable, buildings keep the list order within a reason
+    return sorted(scheduled, key=lambda item: item[1])
+
+
+def _change_reason(building: Building, last_pass: Optional[tuple],
+                   recheck_before: Optional[datetime]) -> Optional[ChangeReason]:
+    if last_pass is None:
+        return ChangeReason.new
+    level, crew, fingerprint, succeeded, updated_at = last_pass
+    if not succeeded:
+        return ChangeReason.failed
+    if fingerprint != building.fingerprint:
+        if building.level != level:
+            return ChangeReason.level_up
+        if building.crew != crew:
+            return ChangeReason.crew
+        return ChangeReason.vehicles
+    if recheck_before and datetime.fromisoformat(updated_at) < recheck_before:
+        return ChangeReason.stale
+    return None
+
+
+class DaemonStatus:
+    """State of the daemon shown by the status endpoint, updated by the builder loop."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.now()
+        self.state = "starting"
+        self.cycle = 0
+        self.last_scan_at: Optional[datetime] = None
+        self.next_scan_at: Optional[datetime] = None
+        self.buildings = 0
+        self.queue: List[Tuple[Building, ChangeReason]] = []
+        self.current: Optional[Tuple[Building, ChangeReason]] = None
+        self.processed = 0
+        self.failed = 0
+        self.last_error: Optional[str] = None
+
+    def scanning(self) -> None:
+        with self._lock:
+            self.state = "scanning"
+            self.cycle += 1
+            self.last_scan_at = datetime.now()
+
+    def scheduled(self, buildings: int, queue: List[Tuple[Building, ChangeReason]]) -> None:
+        with self._lock:
+            self.state = "working"
+            self.buildings = buildings
+            self.queue = list(queue)
+
+    def working_on(self, building: Building, reason: ChangeReason) -> None:
+        with self._lock:
+            self.current = (building, reason)
+            self.queue = [item for item in self.queue if item[0] is not building]
+
+    def finished(self, succeeded: bool) -> None:
+        with self._lock:
+            self.current = None
+            self.processed += 1
+            if not succeeded:
+                self.failed += 1
+
+    def error(self, err: Exception) -> None:
+        with self._lock:
+            self.last_error = f"{datetime.now().isoformat()} {err}"
+
+    def sleeping(self, next_scan_at: datetime) -> None:
+        with self._lock:
+            self.state = "sleeping"
+            self.current = None
+            self.queue = []
+            self.next_scan_at = next_scan_at
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "started_at": self.started_at.isoformat(),
+                "cycle": self.cycle,
+                "last_scan_at": self.last_scan_at.isoformat() if self.last_scan_at else None,
+                "next_scan_at": self.next_scan_at.isoformat() if self.next_scan_at else None,
+                "buildings": self.buildings,
+                "current": _queued(*self.current) if self.current else None,
+                "queue": [_queued(building, reason) for building, reason in self.queue],
+                "processed": self.processed,
+                "failed": self.failed,
+                "last_error": self.last_error,
+            }
+
+
+def _queued(building: Building, reason: ChangeReason) -> Dict[str, str]:
+    return {"id": building.id, "name": building.name, "reason": reason.name}
+
+
+class StatusServer:
+    """
+    Local HTTP endpoint of the daemon: `/` answers with the status as JSON,
+    `/metrics` with the command metrics in the Prometheus text format.
+    """
+
+    def __init__(self, port: int, status: DaemonStatus, host: str = "127.0.0.1"):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path == "/":
+                    body, content_type = json.dumps(status.to_dict(), indent=2), "application/json"
+                elif self.path == "/metrics":
+                    body, content_type = METRICS.prometheus_text(), "text/plain; version=0.0.4"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self._thread = threading.Thread(target=self.server.serve_forever, name="status-server", daemon=True)
+
+    def start(self) -> "StatusServer":
+        self._thread.start()
+        host, port = self.server.server_address[:2]
+        cprint(f'Daemon status on http://{host}:{port}/', 'cyan')
+        return self
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,149 @@
+import csv
+import json
+from array import array
+from typing import Callable, List
+
+from builder_const import Building, BuildingCategory, VehicleCategory
+from crew_planner import count_assigned_crew
+
+
+def education_label(education: frozenset) -> str:
+    return "+".join(sorted(education)) or "-"
+
+
+class FleetAnalysis:
+    """
+    Vehicle deficits against the builder schema, crew shortfalls per education and space needed for every
+    building of the fleet. Counts are kept in flat int arrays, one row per building, so a fleet of thousands
+    of stations is analysed in a single pass without per-building dicts.
+    """
+
+    def __init__(self, buildings: List[Building], schema_for: Callable[[Building], dict]):
+        self.buildings = buildings
+        schemas = [schema_for(building) for building in buildings]
+        self.vehicle_types = sorted({name for schema in schemas for name in schema})
+        self.educations = sorted(
+            {target.education_f for schema in schemas for target in schema.values()
+             if target.category is VehicleCategory.car and target.crew},
+            key=education_label,
+        )
+        vehicle_index = {name: i for i, name in enumerate(self.vehicle_types)}
+        education_index = {education: i for i, education in enumerate(self.educations)}
+        types, educations = len(self.vehicle_types), len(self.educations)
+
+        self.missing = array('i', bytes(4 * len(buildings) * types))
+        self.needed_crew = array('i', bytes(4 * len(buildings) * educations))
+        self.available_crew = array('i', bytes(4 * len(buildings) * educations))
+        self.shortfall = array('i', bytes(4 * len(buildings) * educations))
+        self.space_needed = array('i', bytes(4 * len(buildings)))
+
+        for row, (building, schema) in enumerate(zip(buildings, schemas)):
+            vehicles_base, crew_base = row * types, row * educations
+            for member in building.crew_members:
+                column = education_index.get(member.education)
+                if column is not None and member.available:
+                    self.available_crew[crew_base + column] += 1
+
+            assigned = count_assigned_crew(building)
+            have = array('i', bytes(4 * types))
+            for vehicle in building.vehicles:
+                column = vehicle_index.get(vehicle.name)
+                if column is None:
+                    continue
+                have[column] += 1
+                target = schema.get(vehicle.name)
+                if target is None:
+                    # in the schema of another category only
+                    continue
+                if target.category is VehicleCategory.car and target.crew:
+                    self.needed_crew[crew_base + education_index[target.education_f]] += \
+                        max(0, target.crew - assigned[vehicle.id])
+
+            space = 0
+            for name, target in schema.items():
+                column = vehicle_index[name]
+                missing = max(0, target.count - have[column])
+                self.missing[vehicles_base + column] = missing
+                if target.category is not VehicleCategory.container:
+                    space += missing
+                if target.category is VehicleCategory.car and target.crew:
+                    self.needed_crew[crew_base + education_index[target.education_f]] += missing * target.crew
+
+            free_space = building.free_space or 0
+            if building.category is BuildingCategory.OPI:
+                free_space -= 3
+            self.space_needed[row] = max(0, space - free_space)
+            for column in range(educations):
+                self.shortfall[crew_base + column] = max(
+                    0, self.needed_crew[crew_base + column] - self.available_crew[crew_base + column],
+                )
+
+    def _row(self, values: array, row: int, width: int) -> List[int]:
+        return list(values[row * width:(row + 1) * width])
+
+    def rows(self) -> List[dict]:
+        types, educations = len(self.vehicle_types), len(self.educations)
+        rows = []
+        for row, building in enumerate(self.buildings):
+            missing = self._row(self.missing, row, types)
+            needed = self._row(self.needed_crew, row, educations)
+            available = self._row(self.available_crew, row, educations)
+            shortfall = self._row(self.shortfall, row, educations)
+            rows.append({
+                "id": building.id,
+                "name": building.name,
+                "category": building.category.name,
+                "level": building.level,
+                "crew": building.crew,
+                "available_crew": building.available_crew,
+                "free_space": building.free_space,
+                "space_needed": self.space_needed[row],
+                "missing_vehicles": {name: count for name, count in zip(self.vehicle_types, missing) if count},
+                "crew_needed": {education_label(e): count for e, count in zip(self.educations, needed) if count},
+                "crew_available": {education_label(e): count for e, count in zip(self.educations, available)},
+                "crew_shortfall": {education_label(e): count for e, count in zip(self.educations, shortfall) if count},
+            })
+        return rows
+
+    def totals(self) -> dict:
+        types, educations = len(self.vehicle_types), len(self.educations)
+        return {
+            "buildings": len(self.buildings),
+            "space_needed": sum(self.space_needed),
+            "buildings_needing_space": sum(1 for space in self.space_needed if space),
+            "missing_vehicles": {
+                name: sum(self.missing[column::types]) for column, name in enumerate(self.vehicle_types)
+                if sum(self.missing[column::types])
+            },
+            "crew_shortfall": {
+                education_label(education): sum(self.shortfall[column::educations])
+                for column, education in enumerate(self.educations)
+            },
+            "buildings_short_of_crew": {
+                education_label(education): sum(1 for count in self.shortfall[column::educations] if count)
+                for column, education in enumerate(self.educations)
+            },
+        }
+
+    def save(self, path: str) -> None:
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                f.write(json.dumps({"totals": self.totals(), "buildings": self.rows()}, indent=2, ensure_ascii=False))
+            return
+
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            labels = [education_label(education) for education in self.educations]
+            writer.writerow(
+                ["id", "name", "category", "level", "crew", "available_crew", "free_space", "space_needed"]
+                + [f"missing {name}" for name in self.vehicle_types]
+                + [f"shortfall {label}" for label in labels]
+            )
+            types, educations = len(self.vehicle_types), len(self.educations)
+            for row, building in enumerate(self.buildings):
+                writer.writerow(
+                    [building.id, building.name, building.category.name, building.level, building.crew,
+                     building.available_crew, building.free_space, self.space_needed[row]]
+                    + self._row(self.missing, row, types)
+                    + self._row(self.shortfall, row, educations)
+                )
@@ -0,0 +1,216 @@
+import re
+import time
+from html.parser import HTMLParser
+from typing import List, Optional
+from urllib.parse import urljoin
+
+import requests
+from requests.adapters import HTTPAdapter
+from instrumentation import METRICS
+from rate_limit import RateLimiter, is_idempotent, TRANSIENT_STATUSES
+from termcolor import cprint
+from utils import TableCell
+
+
+VOID_TAGS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr",
+}
+# tags closed implicitly by the next sibling of the same kind
+IMPLICIT_CLOSE = {
+    "td": {"td", "th", "tr"},
+    "th": {"td", "th", "tr"},
+    "tr": {"tr", "tbody", "thead", "tfoot"},
+    "li": {"li"},
+    "dd": {"dd", "dt"},
+    "dt": {"dd", "dt"},
+    "option": {"option"},
+}
+SKIPPED_TEXT_TAGS = {"script", "style"}
+BLOCK_TAGS = {"br", "div", "p", "li", "tr", "dd", "dt", "h1", "h2", "h3", "h4", "h5"}
+
+
+class HtmlNode:
+    def __init__(self, tag: str, attrs: dict, parent: Optional["HtmlNode"] = None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parent = parent
+        self.children = []
+
+    @property
+    def classes(self) -> List[str]:
+        return (self.attrs.get("class") or "").split()
+
+    def iter(self):
+        for child in self.children:
+            if isinstance(child, HtmlNode):
+                yield child
+                yield from child.iter()
+
+    def find_all(self, tag: str) -> List["HtmlNode"]:
+        return [node for node in self.iter() if node.tag == tag]
+
+    def find(self, tag: str) -> Optional["HtmlNode"]:
+        return next((node for node in self.iter() if node.tag == tag), None)
+
+    def children_by_tag(self, tag: str) -> List["HtmlNode"]:
+        return [child for child in self.children if isinstance(child, HtmlNode) and child.tag == tag]
+
+    def find_by_id(self, element_id: str) -> Optional["HtmlNode"]:
+        return next((node for node in self.iter() if node.attrs.get("id") == element_id), None)
+
+    def find_by_class(self, class_name: str) -> Optional["HtmlNode"]:
+        return next((node for node in self.iter() if class_name in node.classes), None)
+
+    def find_all_by_class(self, class_name: str) -> List["HtmlNode"]:
+        return [node for node in self.iter() if class_name in node.classes]
+
+    @property
+    def inner_html(self) -> str:
+        return "".join(_render(child) for child in self.children)
+
+    @property
+    def text(self) -> str:
+        parts = []
+        self._collect_text(parts)
+        lines = [re.sub(r"[ \t\r\f\v\xa0]+", " ", line).strip() for line in "".join(parts).split("\n")]
+        return "\n".join(line for line in lines if line)
+
+    def _collect_text(self, parts: list) -> None:
+        if self.tag in SKIPPED_TEXT_TAGS:
+            return
+        if self.tag in BLOCK_TAGS:
+            parts.append("\n")
+        for child in self.children:
+            if isinstance(child, HtmlNode):
+                child._collect_text(parts)
+            else:
+                parts.append(re.sub(r"\s+", " ", child))
+        if self.tag in BLOCK_TAGS:
+            parts.append("\n")
+
+
+def _render(node) -> str:
+    if not isinstance(node, HtmlNode):
+        return node
+    attrs = "".join(f' {k}="{v}"' if v is not None else f" {k}" for k, v in node.attrs.items())
+    if node.tag in VOID_TAGS:
+        return f"<{node.tag}{attrs}>"
+    return f"<{node.tag}{attrs}>{node.inner_html}</{node.tag}>"
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = HtmlNode("document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        closes = {t for t, closing in IMPLICIT_CLOSE.items() if tag in closing}
+        while len(self.stack) > 1 and self.stack[-1].tag in closes:
+            self.stack.pop()
+        node = HtmlNode(tag, dict(attrs), self.stack[-1])
+        self.stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self.stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        node = HtmlNode(tag, dict(attrs), self.stack[-1])
+        self.stack[-1].children.append(node)
+
+    def handle_endtag(self, tag):
+        for i in range(len(self.stack) - 1, 0, -1):
+            if self.stack[i].tag == tag:
+                del self.stack[i:]
+                return
+
+    def handle_data(self, data):
+        self.stack[-1].children.append(data)
+
+
+class HtmlPage:
+    def __init__(self, html: str, url: str = ""):
+        builder = _TreeBuilder()
+        builder.feed(html)
+        builder.close()
+        self.root = builder.root
+        self.url = url
+
+    def find_by_id(self, element_id: str) -> Optional[HtmlNode]:
+        return self.root.find_by_id(element_id)
+
+    def find_all_by_class(self, class_name: str) -> List[HtmlNode]:
+        return self.root.find_all_by_class(class_name)
+
+    def table_data(self, table_id=None, class_name=None) -> List[List[TableCell]]:
+        # same shape as utils.get_table_data, so parsers work with both backends
+        table = self.root.find_by_id(table_id) if table_id else self.root.find_by_class(class_name)
+        if table is None:
+            return []
+        tbody = table.find("tbody")
+        if tbody is None:
+            return []
+        return [[self._cell(td) for td in tr.find_all("td")] for tr in tbody.find_all("tr")]
+
+    def _cell(self, td: HtmlNode) -> TableCell:
+        links = td.find_all("a")
+        bold = td.find("b")
+        return TableCell(
+            text=td.text,
+            hrefs=[urljoin(self.url, a.attrs.get("href") or "") for a in links],
+            link_texts=[a.text for a in links],
+            img_alts=[img.attrs.get("alt") or "" for img in td.find_all("img")],
+            bold=bold.inner_html if bold is not None else None,
+            form_actions=[urljoin(self.url, form.attrs.get("action") or "") for form in td.find_all("form")],
+        )
+
+
+class HttpReader:
+    """Read-only page access sharing the cookies of a logged in browser session."""
+
+    def __init__(self, session: requests.Session, timeout: int = 30, rate_limiter: Optional[RateLimiter] = None):
+        self.session = session
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+    @classmethod
+    def from_driver(cls, driver, pool_size: int = 10, rate_limiter: Optional[RateLimiter] = None) -> "HttpReader":
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = driver.execute_script("return navigator.userAgent;")
+        for cookie in driver.get_cookies():
+            session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain"), path=cookie.get("path", "/"),
+            )
+        cprint('HTTP reads enabled.', 'cyan')
+        return cls(session, rate_limiter=rate_limiter)
+
+    def request(self, url: str) -> requests.Response:
+        response = self.rate_limiter.call(
+            self._get, url, transient=_is_transient if is_idempotent(url) else None, observe=True,
+        )
+        response.raise_for_status()
+        if "/users/sign_in" in response.url:
+            raise RuntimeError(f"Session is not logged in, redirected from {url}")
+        return response
+
+    def get(self, url: str) -> HtmlPage:
+        response = self.request(url)
+        return HtmlPage(response.text, response.url)
+
+    def _get(self, url: str) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            response = self.session.get(url, timeout=self.timeout)
+        finally:
+            METRICS.record("http_get", time.perf_counter() - start)
+        if response.status_code in TRANSIENT_STATUSES:
+            response.raise_for_status()
+        return response
+
+
+def _is_transient(err: Exception) -> bool:
+    if isinstance(err, requests.HTTPError):
+        return err.response is not None and err.response.status_code in TRANSIENT_STATUSES
+    return isinstance(err, (requests.ConnectionError, requests.Timeout))
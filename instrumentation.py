@@ -0,0 +1,216 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+from termcolor import cprint
+
+from builder_const import Building
+
+
+NO_PHASE = "other"
+
+
+class Metrics:
+    """
+    Counts and latencies of WebDriver commands, HTTP reads, waits and throttling, per phase and per building.
+    Commands are attributed to the innermost phase of the calling thread, phase times are inclusive.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.monotonic()
+        self.phases = {}
+        self.commands = {}
+        self.buildings = {}
+
+    def current(self) -> Tuple[str, Optional[str]]:
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else (NO_PHASE, None)
+
+    @contextmanager
+    def phase(self, name: str, building: Optional[Building] = None):
+        _, current_building = self.current()
+        building_id = building.id if building is not None else current_building
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append((name, building_id))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            stack.pop()
+            with self._lock:
+                _add(self.phases, name, elapsed)
+
+    def record(self, command: str, elapsed: float) -> None:
+        phase, building_id = self.current()
+        with self._lock:
+            _add(self.commands.setdefault(phase, {}), command, elapsed)
+            if building_id is not None:
+                _add(self.buildings.setdefault(building_id, {}), command, elapsed)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "run_seconds": round(time.monotonic() - self.started, 3),
+                "phases": {name: _entry(value) for name, value in self.phases.items()},
+                "commands": {
+                    phase: {command: _entry(value) for command, value in commands.items()}
+                    for phase, commands in self.commands.items()
+                },
+                "buildings": {
+                    building_id: {command: _entry(value) for command, value in commands.items()}
+                    for building_id, commands in self.buildings.items()
+                },
+            }
+
+    def save_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(json.dumps(self.to_dict(), indent=2))
+
+    def prometheus_text(self) -> str:
+        data = self.to_dict()
+        lines = [
+            "# HELP builder_run_seconds Duration of the builder run.",
+            "# TYPE builder_run_seconds gauge",
+            f'builder_run_seconds {data["run_seconds"]}',
+            "# HELP builder_phase_calls_total Calls of a builder phase.",
+            "# TYPE builder_phase_calls_total counter",
+        ]
+        lines += [f'builder_phase_calls_total{{phase="{name}"}} {e["count"]}' for name, e in data["phases"].items()]
+        lines += [
+            "# HELP builder_phase_seconds_total Time spent in a builder phase, nested phases included.",
+            "# TYPE builder_phase_seconds_total counter",
+        ]
+        lines += [f'builder_phase_seconds_total{{phase="{name}"}} {e["seconds"]}' for name, e in data["phases"].items()]
+        for metric, key, help_text in [
+            ("builder_commands_total", "count", "Browser commands, HTTP reads, waits and throttling by phase."),
+            ("builder_command_seconds_total", "seconds", "Time spent in commands by phase."),
+        ]:
+            lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+            for phase, commands in data["commands"].items():
+                lines += [
+                    f'{metric}{{phase="{phase}",command="{command}"}} {entry[key]}'
+                    for command, entry in commands.items()
+                ]
+        return "\n".join(lines) + "\n"
+
+    def save_prometheus(self, path: str) -> None:
+        # written next to the target and renamed, so the textfile collector never reads half a file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    def report(self) -> None:
+        data = self.to_dict()
+        totals = {}
+        for commands in data["commands"].values():
+            for command, entry in commands.items():
+                count, seconds = totals.get(command, (0, 0.0))
+                totals[command] = (count + entry["count"], seconds + entry["seconds"])
+        cprint('Commands:', 'cyan')
+        for command, (count, seconds) in sorted(totals.items(), key=lambda item: -item[1][1]):
+            cprint(f'  {command}: {count}x, {seconds:.1f}s', 'cyan')
+        cprint('Phases:', 'cyan')
+        for name, entry in sorted(data["phases"].items(), key=lambda item: -item[1]["seconds"]):
+            cprint(f'  {name}: {entry["count"]}x, {entry["seconds"]:.1f}s, avg {entry["avg_ms"]:.0f}ms', 'cyan')
+
+
+def _add(entries: dict, key: str, elapsed: float) -> None:
+    count, total = entries.get(key, (0, 0.0))
+    entries[key] = (count + 1, total + elapsed)
+
+
+def _entry(value: Tuple[int, float]) -> dict:
+    count, seconds = value
+    return {"count": count, "seconds": round(seconds, 4), "avg_ms": round(1000 * seconds / count, 3)}
+
+
+METRICS = Metrics()
+
+
+def timed_phase(name: str):
+    """Runs the function as a phase of METRICS, for the Building passed to it or the one of the enclosing phase."""
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            building = kwargs.get("building")
+            if building is None:
+                building = next((arg for arg in args if isinstance(arg, Building)), None)
+            with METRICS.phase(name, building):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class InstrumentedElement:
+    """WebElement proxy recording every call that is a round trip to the browser."""
+
+    PROPERTIES = {"text", "tag_name", "size", "location", "rect"}
+
+    def __init__(self, element, metrics: Metrics):
+        self._element = element
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        if name in self.PROPERTIES:
+            start = time.perf_counter()
+            try:
+                return getattr(self._element, name)
+            finally:
+                self._metrics.record(f"element.{name}", time.perf_counter() - start)
+        attr = getattr(self._element, name)
+        if not callable(attr):
+            return attr
+        command = "click" if name == "click" else f"element.{name}"
+        return _timed(attr, command, self._metrics)
+
+
+class InstrumentedDriver:
+    """WebDriver proxy recording count and latency of every command into METRICS."""
+
+    COMMANDS = {
+        "get", "refresh", "back", "find_element", "find_elements", "execute_script", "execute_async_script",
+        "save_screenshot", "get_cookies",
+    }
+
+    def __init__(self, driver, metrics: Metrics = METRICS):
+        self._driver = driver
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attr = getattr(self._driver, name)
+        if name not in self.COMMANDS:
+            return attr
+        return _timed(attr, name, self._metrics)
+
+    def execute_script(self, script: str, *args):
+        # scripts clicking elements are the only way the builder clicks
+        command = "click" if "click()" in script else "execute_script"
+        args = [arg._element if isinstance(arg, InstrumentedElement) else arg for arg in args]
+        return _timed(self._driver.execute_script, command, self._metrics)(script, *args)
+
+
+def _timed(function, command: str, metrics: Metrics):
+    def timed(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            metrics.record(command, time.perf_counter() - start)
+        if command.endswith("find_element"):
+            return InstrumentedElement(result, metrics)
+        if command.endswith("find_elements"):
+            return [InstrumentedElement(element, metrics) for element in result]
+        return result
+
+    return timed
@@ -0,0 +1,166 @@
+import dataclasses
+import json
+import os
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from typing import List, Optional
+
+import click
+from termcolor import cprint
+
+from utils import get_path, get_config
+
+
+BUILDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "builder.py")
+
+
+@dataclasses.dataclass
+class Job:
+    name: str
+    cpr: str
+    login: Optional[str]
+    password: Optional[str]
+    args: List[str]
+
+
+@dataclasses.dataclass
+class JobResult:
+    job: Job
+    exit_code: int
+    seconds: float
+    buildings: int
+    errors: int
+    log_file: str
+
+
+def load_jobs(path: str) -> List[Job]:
+    """Every section of the jobs file is one account/CPR: cpr, optional login, password and builder args."""
+    jobs_config = ConfigParser()
+    jobs_config.read(path)
+    return [
+        Job(
+            name=name,
+            cpr=section['cpr'],
+            login=section.get('login'),
+            password=section.get('password'),
+            args=shlex.split(section.get('args', '')),
+        )
+        for name, section in jobs_config.items()
+        if name != jobs_config.default_section
+    ]
+
+
+def prepare_job_dir(job: Job, jobs_dir: str) -> str:
+    """
+    Working directory of the job, with config.ini and builder schemas copied from the main one.
+    State, journal, catalog, browser profile, logs and error screenshots of the job stay in it.
+    """
+    job_dir = os.path.join(jobs_dir, job.name)
+    os.makedirs(job_dir, exist_ok=True)
+    config = get_config()
+    if not config.has_section('BUILDER'):
+        config.add_section('BUILDER')
+    config['BUILDER']['cpr'] = job.cpr
+    # credentials are passed through the environment, they are not copied around
+    config.remove_section('AUTH')
+    with open(os.path.join(job_dir, 'config.ini'), 'w') as f:
+        config.write(f)
+
+    schema_files = {config['BUILDER'].get('builder_schema', 'builder_schema.json')}
+    if config.has_section('BUILDER_SCHEMAS'):
+        schema_files.update(config['BUILDER_SCHEMAS'].values())
+    for schema_file in schema_files:
+        if os.path.exists(get_path(schema_file)):
+            target = os.path.join(job_dir, schema_file)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            shutil.copyfile(get_path(schema_file), target)
+    return job_dir
+
+
+def run_job(job: Job, jobs_dir: str) -> JobResult:
+    job_dir = prepare_job_dir(job, jobs_dir)
+    # jobs without their own credentials use the [AUTH] section of the main config.ini
+    auth = get_config()['AUTH'] if get_config().has_section('AUTH') else {}
+    env = dict(os.environ)
+    env['LOGIN'] = job.login or auth.get('login', '')
+    env['PASSWORD'] = job.password or auth.get('password', '')
+    command = [
+        sys.executable, BUILDER_SCRIPT, '--browser-profile', 'chrome_profile', '--metrics-out', 'metrics.json',
+        *job.args,
+    ]
+    log_file = os.path.join(job_dir, 'builder.log')
+    metrics_file = os.path.join(job_dir, 'metrics.json')
+    if os.path.exists(metrics_file):
+        os.remove(metrics_file)
+    errors_before = _count_errors(job_dir)
+
+    cprint(f'[{job.name}] started, CPR {job.cpr}', 'cyan')
+    start = time.monotonic()
+    with open(log_file, 'w') as log:
+        exit_code = subprocess.call(command, cwd=job_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    seconds = time.monotonic() - start
+    cprint(f'[{job.name}] finished with exit code {exit_code} in {seconds:.0f}s', 'green' if exit_code == 0 else 'red')
+
+    return JobResult(
+        job=job,
+        exit_code=exit_code,
+        seconds=seconds,
+        buildings=_count_buildings(metrics_file),
+        errors=_count_errors(job_dir) - errors_before,
+        log_file=log_file,
+    )
+
+
+def _count_buildings(metrics_file: str) -> int:
+    if not os.path.exists(metrics_file):
+        return 0
+    with open(metrics_file, 'r') as f:
+        phases = json.loads(f.read())["phases"]
+    return sum(phases.get(phase, {}).get("count", 0) for phase in ("process_building", "execute_building"))
+
+
+def _count_errors(job_dir: str) -> int:
+    return len([file for file in os.listdir(job_dir) if file.startswith('error') and file.endswith('.txt')])
+
+
+def print_summary(results: List[JobResult]) -> None:
+    cprint(f'{"job":20} {"cpr":>8} {"exit":>5} {"time s":>8} {"buildings":>10} {"errors":>7}', 'magenta')
+    for result in results:
+        cprint(
+            f'{result.job.name:20} {result.job.cpr:>8} {result.exit_code:>5} {result.seconds:>8.0f} '
+            f'{result.buildings:>10} {result.errors:>7}',
+            'green' if result.exit_code == 0 and not result.errors else 'red',
+        )
+    failed = [result for result in results if result.exit_code != 0]
+    for result in failed:
+        cprint(f'{result.job.name} failed, see {result.log_file}', 'red')
+
+
+@click.command()
+@click.option("--jobs", "jobs_file", type=click.STRING, default='jobs.ini')
+@click.option("--jobs-dir", "jobs_dir", type=click.STRING, default='jobs')
+@click.option("--concurrency", "concurrency", type=click.IntRange(min=1), default=None)
+def orchestrator(jobs_file, jobs_dir, concurrency):
+    jobs = load_jobs(get_path(jobs_file))
+    if not jobs:
+        cprint(f'No jobs in {jobs_file}', 'red')
+        sys.exit(1)
+    concurrency = concurrency or min(len(jobs), os.cpu_count() or 1)
+    cprint(f'Running {len(jobs)} jobs, {concurrency} at a time...', 'cyan')
+
+    jobs_dir = get_path(jobs_dir)
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda job: run_job(job, jobs_dir), jobs))
+
+    print_summary(results)
+    if any(result.exit_code != 0 for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    orchestrator()
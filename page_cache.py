@@ -0,0 +1,57 @@
+import threading
+from typing import Any, Dict, Optional
+
+from builder_const import Building, BUILDING_BASE_URL
+from instrumentation import METRICS
+
+
+def details_url(building: Building) -> str:
+    return f"{BUILDING_BASE_URL}{building.id}"
+
+
+def personals_url(building: Building) -> str:
+    return f"{BUILDING_BASE_URL}{building.id}/personals"
+
+
+def expansions_key(building: Building) -> str:
+    # the expansions table is on the details page, it changes with other actions than the rest of it
+    return f"{details_url(building)}#expansions"
+
+
+class PageCache:
+    """
+    Snapshots parsed from game pages in the current run, by building and URL. Every action drops the pages
+    it changes, everything of a building is dropped once the building is processed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshots: Dict[Any, Dict[str, Any]] = {}
+
+    def get(self, building: Building, key: str) -> Optional[Any]:
+        with self._lock:
+            snapshot = self._snapshots.get(building.id, {}).get(key)
+        if snapshot is not None:
+            METRICS.record("page_cache_hit", 0.0)
+        return snapshot
+
+    def put(self, building: Building, key: str, snapshot: Any) -> None:
+        with self._lock:
+            self._snapshots.setdefault(building.id, {})[key] = snapshot
+
+    def invalidate(self, building: Building, *keys: str) -> None:
+        """Drops the given pages of the building, all of them without keys."""
+        with self._lock:
+            if not keys:
+                self._snapshots.pop(building.id, None)
+                return
+            pages = self._snapshots.get(building.id, {})
+            for key in keys:
+                pages.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._snapshots.clear()
+
+
+PAGE_CACHE = PageCache()
@@ -0,0 +1,117 @@
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set
+
+import requests
+from termcolor import cprint
+
+from builder_const import Building, BUILDING_BASE_URL
+from http_reader import HttpReader, HtmlPage
+from instrumentation import METRICS
+
+
+def building_read_urls(building: Building) -> List[str]:
+    """Read-only pages loaded for every building: personnel, then details with vehicles and expansions."""
+    return [f"{BUILDING_BASE_URL}{building.id}/personals", f"{BUILDING_BASE_URL}{building.id}"]
+
+
+class PrefetchingReader:
+    """
+    HttpReader running ahead of the builder: pages of the next `depth` buildings are fetched in a background
+    thread while the current building is processed. A fetched page is served until an action on its building
+    invalidates it or the building is released after processing. Everything else, including the requests
+    doing actions, goes straight to the wrapped reader.
+    """
+
+    def __init__(self, reader: HttpReader, fetch_reader: HttpReader, buildings: List[Building], depth: int = 2,
+                 urls_for: Callable[[Building], List[str]] = building_read_urls):
+        self.reader = reader
+        # own session for the background thread, requests sessions are not meant to be shared between threads
+        self.fetch_reader = fetch_reader
+        self.depth = depth
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._released: Set[str] = set()
+        self._pages: Dict[str, HtmlPage] = {}
+        self._in_flight: Set[str] = set()
+        self._urls: Dict[str, List[str]] = {}
+        self._plan = [(building, urls_for(building)) for building in buildings]
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+
+    def start(self) -> "PrefetchingReader":
+        cprint(f'Prefetching pages of {self.depth} buildings ahead.', 'cyan')
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._pages.clear()
+            self._in_flight.clear()
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _run(self) -> None:
+        for building, urls in self._plan:
+            if not urls:
+                continue
+            with self._condition:
+                while len(self._urls) >= self.depth and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                if building.id in self._released:
+                    # the builder got to it first
+                    continue
+                self._urls[building.id] = urls
+                self._in_flight.update(urls)
+            with METRICS.phase("prefetch", building):
+                for url in urls:
+                    try:
+                        page = self.fetch_reader.get(url)
+                    except (requests.RequestException, RuntimeError) as err:
+                        # the builder reads the page itself and handles the error on its own building
+                        cprint(f'Prefetch of {url} failed: {err}', 'yellow')
+                        page = None
+                    with self._condition:
+                        if url in self._in_flight:
+                            self._in_flight.discard(url)
+                            if page is not None:
+                                self._pages[url] = page
+                            self._condition.notify_all()
+
+    def get(self, url: str) -> HtmlPage:
+        start = time.perf_counter()
+        with self._condition:
+            while url in self._in_flight:
+                self._condition.wait()
+            page = self._pages.get(url)
+        if page is None:
+            return self.reader.get(url)
+        METRICS.record("prefetch_hit", time.perf_counter() - start)
+        return page
+
+    def request(self, url: str) -> requests.Response:
+        return self.reader.request(url)
+
+    def invalidate(self, building: Building) -> None:
+        """Drops pages of the building, an action changed it. Fetches still running are discarded too."""
+        with self._condition:
+            for url in self._urls.get(building.id, []):
+                self._pages.pop(url, None)
+                self._in_flight.discard(url)
+            self._condition.notify_all()
+
+    def release(self, building: Building) -> None:
+        """The building is done, its pages are dropped and the next building can be fetched."""
+        with self._condition:
+            self._released.add(building.id)
+            for url in self._urls.pop(building.id, []):
+                self._pages.pop(url, None)
+                self._in_flight.discard(url)
+            self._condition.notify_all()
+
+
+def invalidate(reader: Optional[HttpReader], building: Building) -> None:
+    if isinstance(reader, PrefetchingReader):
+        reader.invalidate(building)
@@ -0,0 +1,159 @@
+import random
+import threading
+import time
+from typing import Callable, List, Optional
+
+from selenium.common.exceptions import StaleElementReferenceException, TimeoutException, WebDriverException
+from termcolor import cprint
+
+from instrumentation import METRICS
+
+
+# GET requests doing an action in the game, they are never repeated
+NON_IDEMPOTENT_PATHS = ("/expand_do/",)
+# answers of an overloaded or restarting server, worth asking again
+TRANSIENT_STATUSES = {429, 500, 502, 503, 504}
+# slowest the governor gets when the server answers slowly, seconds between requests
+MAX_INTERVAL = 10.0
+
+
+def is_idempotent(url: str) -> bool:
+    return not any(path in url for path in NON_IDEMPOTENT_PATHS)
+
+
+def is_transient_driver_error(err: Exception) -> bool:
+    if isinstance(err, (TimeoutException, StaleElementReferenceException)):
+        return True
+    # connection resets and similar network errors of the browser
+    return isinstance(err, WebDriverException) and "net::ERR_" in (err.msg or "")
+
+
+class RateLimiter:
+    """
+    Request governor shared by all sessions and worker threads. Keeps requests under `requests_per_second`,
+    retries transient failures with jittered exponential backoff and spaces requests out when page loads
+    get slower than `slow_seconds`, going back to full speed once the server recovers.
+    """
+
+    def __init__(self, requests_per_second: float = 0, retries: int = 3, slow_seconds: float = 0,
+                 backoff: float = 1.0):
+        self.min_interval = 1 / requests_per_second if requests_per_second > 0 else 0
+        self.interval = self.min_interval
+        self.retries = retries
+        self.slow_seconds = slow_seconds
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+        self._latency: Optional[float] = None
+
+    def wait(self) -> None:
+        with self._lock:
+            if not self.interval:
+                return
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+            METRICS.record("throttle", slot - now)
+
+    def call(self, function, *args, transient: Optional[Callable[[Exception], bool]] = None,
+             observe: bool = False, **kwargs):
+        """
+        Runs a request in a rate limiter slot. Errors for which `transient` is true are retried,
+        `observe` feeds the request time into the slow server detection.
+        """
+        attempt = 0
+        while True:
+            self.wait()
+            start = time.perf_counter()
+            try:
+                result = function(*args, **kwargs)
+            except Exception as err:
+                if transient is None or not transient(err) or attempt >= self.retries:
+                    raise
+                attempt += 1
+                self._slow_down()
+                delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                cprint(f'{type(err).__name__}, retrying in {delay:.1f}s ({attempt} of {self.retries})', 'yellow')
+                METRICS.record("retry", delay)
+                time.sleep(delay)
+                continue
+            if observe:
+                self.observe(time.perf_counter() - start)
+            return result
+
+    def observe(self, elapsed: float) -> None:
+        slow = False
+        if self.slow_seconds:
+            with self._lock:
+                self._latency = elapsed if self._latency is None else 0.8 * self._latency + 0.2 * elapsed
+                slow = self._latency > self.slow_seconds
+        if slow:
+            self._slow_down()
+        else:
+            self._speed_up()
+
+    def report_statuses(self, statuses: List[int]) -> None:
+        """HTTP statuses of requests the page sent by itself, an overloaded server slows the governor down."""
+        if any(status in TRANSIENT_STATUSES for status in statuses):
+            self._slow_down()
+        elif statuses:
+            self._speed_up()
+
+    def _slow_down(self) -> None:
+        with self._lock:
+            was_full_speed = self.interval == self.min_interval
+            self.interval = min(MAX_INTERVAL, max(self.interval * 1.5, self.min_interval, 0.25))
+        if was_full_speed:
+            cprint(f'Server answers slowly, {self.interval:.2f}s between requests', 'yellow')
+
+    def _speed_up(self) -> None:
+        with self._lock:
+            if self.interval == self.min_interval:
+                return
+            self.interval = self.interval * 0.9
+            recovered = self.interval < self.min_interval + 0.05
+            if recovered:
+                self.interval = self.min_interval
+        if recovered:
+            cprint('Server answers normally again, back to full speed', 'green')
+
+
+class RateLimitedDriver:
+    """
+    WebDriver proxy sending every request hitting the game through the governor. Page loads and reading
+    scripts are retried on transient errors, clicks and actions are not, repeating them could buy twice.
+    """
+
+    LIMITED_METHODS = {"get", "refresh", "execute_script", "execute_async_script"}
+
+    def __init__(self, driver, rate_limiter: RateLimiter):
+        self._driver = driver
+        self._rate_limiter = rate_limiter
+
+    @property
+    def rate_limiter(self) -> RateLimiter:
+        return self._rate_limiter
+
+    def __getattr__(self, name):
+        attr = getattr(self._driver, name)
+        if name not in self.LIMITED_METHODS:
+            return attr
+
+        def limited(*args, **kwargs):
+            return self._rate_limiter.call(
+                attr, *args, transient=is_transient_driver_error if _retryable(name, args) else None,
+                observe=name in ("get", "refresh"), **kwargs,
+            )
+
+        return limited
+
+
+def _retryable(name: str, args: tuple) -> bool:
+    if name == "get":
+        return is_idempotent(args[0])
+    if name == "execute_script":
+        # same rule as the instrumentation, scripts clicking elements are actions
+        return "click()" not in args[0]
+    return name == "refresh"
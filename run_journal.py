@@ -0,0 +1,161 @@
+import enum
+import json
+import os
+import sys
+import threading
+from datetime import datetime
+from typing import List, Optional, Dict
+
+from builder_const import Building, BuildingCategory, CrewMember, Vehicle, education_set
+
+
+class JournalStep(str, enum.Enum):
+    recruitment = "recruitment"
+    # crew and vehicles of the building were read
+    loaded = "loaded"
+    extended = "extended"
+    bought_vehicle = "bought_vehicle"
+    bought = "bought"
+    assigned = "assigned"
+    expansions = "expansions"
+    done = "done"
+
+
+class RunJournal:
+    """
+    Append-only log of the steps completed in a run, one JSON line per step, flushed to disk
+    right away. After a crash `--resume` continues the last run from it.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+        self.run = None
+        self._steps: Dict[Optional[str], Dict[JournalStep, list]] = {}
+
+    def start(self, cpr, categories: List[BuildingCategory], buildings: List[Building]) -> None:
+        self._file = open(self.path, 'w')
+        self._steps = {}
+        self.run = {
+            "event": "run",
+            "started_at": datetime.now().isoformat(),
+            "cpr": str(cpr),
+            "categories": [category.name for category in categories],
+            "buildings": [_listed_building(building) for building in buildings],
+        }
+        self._write(self.run)
+
+    def resume(self) -> bool:
+        """Loads the last run of the journal, returns False if there is none."""
+        if not os.path.exists(self.path):
+            return False
+        entries = []
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # line cut short by the crash
+                    break
+        runs = [i for i, entry in enumerate(entries) if entry.get("event") == "run"]
+        if not runs:
+            return False
+        self.run = entries[runs[-1]]
+        self._steps = {}
+        for entry in entries[runs[-1] + 1:]:
+            steps = self._steps.setdefault(entry.get("building"), {})
+            steps.setdefault(JournalStep(entry["step"]), []).append(entry.get("data") or {})
+        self._file = open(self.path, 'a')
+        return True
+
+    def buildings(self) -> List[Building]:
+        return [_building(raw, self.run["cpr"]) for raw in self.run["buildings"]]
+
+    def pending_buildings(self) -> List[Building]:
+        return [building for building in self.buildings() if not self.has(building, JournalStep.done)]
+
+    def record(self, building: Optional[Building], step: JournalStep, **data) -> None:
+        building_id = building.id if building is not None else None
+        with self._lock:
+            self._steps.setdefault(building_id, {}).setdefault(step, []).append(data)
+        self._write({"building": building_id, "step": step.value, "data": data})
+
+    def has(self, building: Optional[Building], step: JournalStep) -> bool:
+        building_id = building.id if building is not None else None
+        with self._lock:
+            return step in self._steps.get(building_id, {})
+
+    def record_loaded(self, building: Building) -> None:
+        self.record(
+            building,
+            JournalStep.loaded,
+            free_space=building.free_space,
+            vehicles_number=building.vehicles_number,
+            available_crew=building.available_crew,
+            crew_members=[
+                [member.name, sorted(member.education), member.assigned, member.state, member.available,
+                 member.assigned_vehicle_id]
+                for member in building.crew_members
+            ],
+            vehicles=[[vehicle.name, vehicle.id] for vehicle in building.vehicles],
+        )
+
+    def restore(self, building: Building) -> bool:
+        """
+        Fills crew and vehicles of the building from the journal. Fails when the building was extended
+        or vehicles were bought after reading it, the snapshot is outdated then.
+        """
+        with self._lock:
+            steps = self._steps.get(building.id, {})
+            loaded = steps.get(JournalStep.loaded)
+            if not loaded or JournalStep.extended in steps or JournalStep.bought_vehicle in steps:
+                return False
+            snapshot = loaded[-1]
+        building.free_space = snapshot["free_space"]
+        building.vehicles_number = snapshot["vehicles_number"]
+        building.available_crew = snapshot["available_crew"]
+        building.crew_members = [
+            CrewMember(
+                name, education_set(education), sys.intern(assigned), sys.intern(state), available,
+                assigned_vehicle_id,
+            )
+            for name, education, assigned, state, available, assigned_vehicle_id in snapshot["crew_members"]
+        ]
+        building.vehicles = [Vehicle(name, vehicle_id) for name, vehicle_id in snapshot["vehicles"]]
+        return True
+
+    def close(self) -> None:
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _write(self, entry: dict) -> None:
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+
+def _listed_building(building: Building) -> dict:
+    return {
+        "id": building.id,
+        "name": building.name,
+        "category": building.category.name,
+        "level": building.level,
+        "crew": building.crew,
+        "fingerprint": building.fingerprint,
+        "recruitment": building.recruitment,
+        "target_crew": building.target_crew,
+        "recruitment_hrefs": building.recruitment_hrefs,
+        "target_crew_url": building.target_crew_url,
+    }
+
+
+def _building(raw: dict, cpr: str) -> Building:
+    return Building(
+        raw["id"], raw["name"], cpr, BuildingCategory[raw["category"]], raw["level"], raw["crew"],
+        None, None, list(), list(), None,
+        fingerprint=raw["fingerprint"], recruitment=raw["recruitment"], target_crew=raw["target_crew"],
+        recruitment_hrefs=raw.get("recruitment_hrefs") or [], target_crew_url=raw.get("target_crew_url"),
+    )
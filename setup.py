@@ -17,6 +17,7 @@ setup(
         "console_scripts": [
             # 'runner = runner:runner',
             "builder = builder:builder",
+            "orchestrator = orchestrator:orchestrator",
         ],
     },
 )
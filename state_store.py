@@ -0,0 +1,152 @@
+import json
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from builder_const import Building, CrewMember, Vehicle, education_set
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buildings (
+    id TEXT PRIMARY KEY,
+    cpr TEXT NOT NULL,
+    category TEXT NOT NULL,
+    name TEXT NOT NULL,
+    level INTEGER NOT NULL,
+    crew INTEGER NOT NULL,
+    fingerprint TEXT,
+    free_space INTEGER,
+    vehicles_number INTEGER,
+    available_crew INTEGER,
+    succeeded INTEGER NOT NULL DEFAULT 0,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS crew_members (
+    building_id TEXT NOT NULL REFERENCES buildings(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    education TEXT NOT NULL,
+    assigned TEXT NOT NULL,
+    state TEXT NOT NULL,
+    available INTEGER NOT NULL,
+    assigned_vehicle_id TEXT,
+    PRIMARY KEY (building_id, position)
+);
+CREATE TABLE IF NOT EXISTS vehicles (
+    building_id TEXT NOT NULL REFERENCES buildings(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (building_id, position)
+);
+"""
+# columns added after the first release of the store, (table, column, definition)
+MIGRATIONS = [
+    ("crew_members", "assigned_vehicle_id", "TEXT"),
+]
+
+
+class StateStore:
+    """Buildings, crew and vehicles from the last successful pass, kept between runs."""
+
+    def __init__(self, path: str):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA foreign_keys = ON")
+        self._lock = threading.Lock()
+        with self._lock, self._connection:
+            self._connection.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self) -> None:
+        for table, column, definition in MIGRATIONS:
+            columns = [row[1] for row in self._connection.execute(f"PRAGMA table_info({table})")]
+            if column not in columns:
+                self._connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def is_unchanged(self, building: Building) -> bool:
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT fingerprint, succeeded FROM buildings WHERE id = ?", (building.id,),
+            ).fetchone()
+        return row is not None and bool(row[1]) and row[0] == building.fingerprint
+
+    def last_passes(self) -> Dict[str, Tuple[int, int, Optional[str], bool, str]]:
+        """Level, crew, fingerprint, success and time of the last pass of every stored building, by id."""
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, level, crew, fingerprint, succeeded, updated_at FROM buildings",
+            ).fetchall()
+        return {
+            building_id: (level, crew, fingerprint, bool(succeeded), updated_at)
+            for building_id, level, crew, fingerprint, succeeded, updated_at in rows
+        }
+
+    def load(self, building: Building) -> bool:
+        """Fills crew and vehicles of an unchanged building from the store, returns False if it changed."""
+        if not building.fingerprint or not self.is_unchanged(building):
+            return False
+        with self._lock:
+            free_space, vehicles_number, available_crew = self._connection.execute(
+                "SELECT free_space, vehicles_number, available_crew FROM buildings WHERE id = ?", (building.id,),
+            ).fetchone()
+            crew_members = self._connection.execute(
+                "SELECT name, education, assigned, state, available, assigned_vehicle_id FROM crew_members"
+                " WHERE building_id = ? ORDER BY position", (building.id,),
+            ).fetchall()
+            vehicles = self._connection.execute(
+                "SELECT name, id FROM vehicles WHERE building_id = ? ORDER BY position", (building.id,),
+            ).fetchall()
+        building.free_space = free_space
+        building.vehicles_number = vehicles_number
+        building.available_crew = available_crew
+        building.crew_members = [
+            CrewMember(
+                name=name,
+                education=education_set(json.loads(education)),
+                assigned=sys.intern(assigned),
+                state=sys.intern(state),
+                available=bool(available),
+                assigned_vehicle_id=assigned_vehicle_id,
+            )
+            for name, education, assigned, state, available, assigned_vehicle_id in crew_members
+        ]
+        building.vehicles = [Vehicle(name, vehicle_id) for name, vehicle_id in vehicles]
+        return True
+
+    def save(self, building: Building, succeeded: bool = True) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM buildings WHERE id = ?", (building.id,))
+            self._connection.execute(
+                "INSERT INTO buildings (id, cpr, category, name, level, crew, fingerprint, free_space,"
+                " vehicles_number, available_crew, succeeded, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    building.id, str(building.cpr), building.category.name, building.name, building.level,
+                    building.crew, building.fingerprint, building.free_space, building.vehicles_number,
+                    building.available_crew, int(succeeded), datetime.now().isoformat(),
+                ),
+            )
+            self._connection.executemany(
+                "INSERT INTO crew_members (building_id, position, name, education, assigned, state, available,"
+                " assigned_vehicle_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        building.id, i, member.name, json.dumps(sorted(member.education)), member.assigned,
+                        member.state, int(member.available), member.assigned_vehicle_id,
+                    )
+                    for i, member in enumerate(building.crew_members)
+                ],
+            )
+            self._connection.executemany(
+                "INSERT INTO vehicles (building_id, position, id, name) VALUES (?, ?, ?, ?)",
+                [(building.id, i, vehicle.id, vehicle.name) for i, vehicle in enumerate(building.vehicles)],
+            )
+
+    def mark_failed(self, building: Building) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE buildings SET succeeded = 0 WHERE id = ?", (building.id,))
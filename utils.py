@@ -1,15 +1,27 @@
 import configparser
+import dataclasses
+import functools
+import json
 import os
+import time
+from contextlib import suppress
+from typing import List, Optional, TYPE_CHECKING
 
 import click
 import unidecode
-from selenium import webdriver
-from selenium.common import NoSuchElementException
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.webdriver import WebDriver
-from selenium.webdriver.common.by import By
+from selenium.common.exceptions import SessionNotCreatedException, WebDriverException
 from termcolor import cprint
-from webdriver_manager.chrome import ChromeDriverManager
+
+from builder_const import GAME_URL
+
+# the browser packages take most of the start up, they are imported once a browser is used
+if TYPE_CHECKING:
+    from selenium.webdriver.chrome.webdriver import WebDriver
+
+# chromedriver resolved by webdriver_manager, reused until Chrome does not accept it
+DRIVER_PATH_FILE = 'chromedriver_path.txt'
+# cookies of the last login, reused until they expire
+SESSION_FILE = 'session_cookies.json'
 
 
 def get_path(file):
@@ -25,7 +37,24 @@ def get_config():
     return config
 
 
-def init_and_log_in(headless: bool = True, page_load: str = None) -> WebDriver:
+# resources the bot never looks at: images, fonts, media and map tiles
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.svg", "*.webp", "*.ico",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp3", "*.ogg", "*.wav", "*.mp4", "*.webm",
+    "*tile.openstreetmap.org*", "*/tiles/*", "*mapbox*",
+]
+# seconds a batch of requests sent from the page may take, the default of WebDriver is 30
+FETCH_SCRIPT_TIMEOUT = 120
+
+
+def init_and_log_in(headless: bool = True, page_load: str = None, lean: bool = False,
+                    profile_dir: Optional[str] = None) -> "WebDriver":
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.wait import WebDriverWait
+
     cprint('Starting web browser...', 'cyan')
     config = get_config()
     chrome_options = Options()
@@ -33,40 +62,291 @@ def init_and_log_in(headless: bool = True, page_load: str = None) -> WebDriver:
         chrome_options.add_argument("--headless")
     if page_load:
         chrome_options.page_load_strategy = page_load
-    driver = webdriver.Chrome(ChromeDriverManager().install(), options=chrome_options)
+    if profile_dir:
+        chrome_options.add_argument(f"--user-data-dir={profile_dir}")
+    if lean:
+        chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+        chrome_options.add_argument("--disable-extensions")
+        chrome_options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    try:
+        driver = webdriver.Chrome(_chromedriver_path(), options=chrome_options)
+    except SessionNotCreatedException:
+        # Chrome was updated since the driver was resolved
+        driver = webdriver.Chrome(_chromedriver_path(refresh=True), options=chrome_options)
+    if lean:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
     driver.set_window_size(1920, 1200)
+    driver.set_script_timeout(FETCH_SCRIPT_TIMEOUT)
     cprint('Trying to sign in...', 'cyan')
-    driver.get("https://www.operatorratunkowy.pl/users/sign_in")
+    driver.get(f"{GAME_URL}/users/sign_in")
+    if "sign_in" not in driver.current_url:
+        cprint('Already signed in with the browser profile.', 'cyan')
+        return driver
+
+    # LOGIN and PASSWORD from the environment take precedence, the orchestrator runs every account that way
+    user = os.environ.get('LOGIN') or config['AUTH']['login']
+    if _restore_session(driver, user):
+        driver.get(f"{GAME_URL}/users/sign_in")
+        if "sign_in" not in driver.current_url:
+            cprint('Signed in with the saved session.', 'cyan')
+            _save_session(driver, user)
+            return driver
+        cprint('Saved session expired, signing in again.', 'yellow')
+        _forget_session()
+        driver.delete_all_cookies()
+        # the form of the page carries a token of the session just deleted
+        driver.get(f"{GAME_URL}/users/sign_in")
 
     login = driver.find_element(By.XPATH, '//*[@id="user_email"]')
-    login.send_keys(config['AUTH']['login'])
+    login.send_keys(user)
 
     password = driver.find_element(By.XPATH, '//*[@id="user_password"]')
-    password.send_keys(config['AUTH']['password'])
+    password.send_keys(os.environ.get('PASSWORD') or config['AUTH']['password'])
 
     driver.find_element(By.XPATH, '//*[@id="new_user"]/input').submit()
+    WebDriverWait(driver, 30).until(lambda d: "sign_in" not in d.current_url)
+    _save_session(driver, user)
 
     return driver
 
 
+def _chromedriver_path(refresh: bool = False) -> str:
+    path_file = get_path(DRIVER_PATH_FILE)
+    if not refresh and os.path.exists(path_file):
+        with open(path_file, 'r') as f:
+            path = f.read().strip()
+        if os.path.exists(path):
+            return path
+
+    from webdriver_manager.chrome import ChromeDriverManager
+
+    path = ChromeDriverManager().install()
+    with open(path_file, 'w') as f:
+        f.write(path)
+    return path
+
+
+def _restore_session(driver, user: str) -> bool:
+    """Adds cookies saved for the game and the user, the sign in page has to be open. False if there are none."""
+    path = get_path(SESSION_FILE)
+    if not os.path.exists(path):
+        return False
+    try:
+        with open(path, 'r') as f:
+            session = json.loads(f.read())
+    except ValueError:
+        _forget_session()
+        return False
+    if session.get("url") != GAME_URL or session.get("user") != user:
+        return False
+    now = time.time()
+    cookies = [cookie for cookie in session.get("cookies", []) if cookie.get("expiry", 0) > now]
+    if not cookies:
+        _forget_session()
+        return False
+    try:
+        for cookie in cookies:
+            driver.add_cookie(cookie)
+    except WebDriverException as err:
+        cprint(f'Saved session could not be used: {err.msg}', 'yellow')
+        _forget_session()
+        # some cookies may be set already, the form has to come with the session it posts to
+        driver.delete_all_cookies()
+        driver.get(f"{GAME_URL}/users/sign_in")
+        return False
+    return True
+
+
+def _save_session(driver, user: str) -> None:
+    # cookies without expiry end with the browser, the game does not sign in with them later
+    cookies = [cookie for cookie in driver.get_cookies() if "expiry" in cookie]
+    if not cookies:
+        _forget_session()
+        return
+    session = {"url": GAME_URL, "user": user, "cookies": cookies}
+    # the cookies sign in as the user, only the owner can read them
+    fd = os.open(get_path(SESSION_FILE), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(json.dumps(session))
+
+
+def _forget_session() -> None:
+    with suppress(FileNotFoundError):
+        os.remove(get_path(SESSION_FILE))
+
+
 def do_click(driver, element):
     driver.execute_script("arguments[0].click();", element)
 
 
 def normalize(element):
-    return unidecode.unidecode(element.text.strip())
+    return normalize_text(element.text)
 
 
-def get_table_rows(driver, table_id=None, class_name=None):
-    try:
-        if table_id:
-            table = driver.find_element(By.ID, table_id)
-        else:
-            table = driver.find_element(By.CLASS_NAME, class_name)
-        table = table.find_element(By.TAG_NAME, "tbody")
-        return table.find_elements(By.TAG_NAME, "tr")
-    except NoSuchElementException as err:
+# table cells repeat the same states, educations and vehicle names all over the fleet
+@functools.lru_cache(maxsize=4096)
+def normalize_text(text: str) -> str:
+    return unidecode.unidecode(text.strip())
+
+
+@dataclasses.dataclass
+class TableCell:
+    text: str
+    hrefs: List[str]
+    link_texts: List[str]
+    img_alts: List[str]
+    bold: Optional[str]
+    form_actions: List[str]
+
+    @property
+    def href(self) -> Optional[str]:
+        return self.hrefs[0] if self.hrefs else None
+
+    @property
+    def normalized(self) -> str:
+        return normalize_text(self.text)
+
+
+def href_id(href: str) -> str:
+    return href.split("/")[-1:][0]
+
+
+# Reads the whole tbody of a table in one WebDriver round trip instead of
+# a find_element/.text/get_attribute call per cell.
+TABLE_DATA_SCRIPT = """
+var table = arguments[0]
+    ? document.getElementById(arguments[0])
+    : document.getElementsByClassName(arguments[1])[0];
+if (!table) { return []; }
+var tbody = table.getElementsByTagName('tbody')[0];
+if (!tbody) { return []; }
+var rows = [];
+var trs = tbody.getElementsByTagName('tr');
+for (var i = 0; i < trs.length; i++) {
+    var cells = [];
+    var tds = trs[i].getElementsByTagName('td');
+    for (var j = 0; j < tds.length; j++) {
+        var td = tds[j];
+        var bold = td.getElementsByTagName('b')[0];
+        cells.push({
+            text: td.innerText || '',
+            hrefs: Array.prototype.map.call(td.getElementsByTagName('a'), function (a) { return a.href; }),
+            link_texts: Array.prototype.map.call(td.getElementsByTagName('a'), function (a) { return a.innerText || ''; }),
+            img_alts: Array.prototype.map.call(td.getElementsByTagName('img'), function (img) { return img.alt; }),
+            bold: bold ? bold.innerHTML : null,
+            form_actions: Array.prototype.map.call(td.getElementsByTagName('form'), function (form) { return form.action; })
+        });
+    }
+    rows.push(cells);
+}
+return rows;
+"""
+
+
+def get_table_data(driver, table_id=None, class_name=None) -> List[List[TableCell]]:
+    rows = driver.execute_script(TABLE_DATA_SCRIPT, table_id, class_name) or []
+    return [[TableCell(**cell) for cell in row] for row in rows]
+
+
+# marks the page before clicking, waits.page_replaced tells when a link navigated away from it
+CLICK_HREF_SCRIPT = """
+var links = document.getElementsByTagName('a');
+for (var i = 0; i < links.length; i++) {
+    if (links[i].href === arguments[0]) {
+        window.builderOldPage = true;
+        links[i].click();
+        return true;
+    }
+}
+return false;
+"""
+
+
+def click_href(driver, href: str) -> bool:
+    return driver.execute_script(CLICK_HREF_SCRIPT, href)
+
+
+# Sends requests from the page with the session of the browser, a few at a time, and
+# returns the HTTP status of each of them, 0 when it did not get an answer. Requests with data submit
+# the real form of the game posting to their url, found on the page or on their form_page, with the data
+# replacing its fields, so hidden fields like _method and utf8 go along.
+FETCH_ALL_SCRIPT = """
+var requests = arguments[0];
+var concurrency = arguments[1];
+var done = arguments[arguments.length - 1];
+var token = document.querySelector('meta[name="csrf-token"]');
+var pages = window.builderFormPages = window.builderFormPages || {};
+var results = new Array(requests.length);
+var next = 0;
+function findForm(doc, base, url) {
+    var forms = doc.getElementsByTagName('form');
+    for (var f = 0; f < forms.length; f++) {
+        if (new URL(forms[f].getAttribute('action') || '', base).href === url) { return forms[f]; }
+    }
+    return null;
+}
+function formBody(request) {
+    var url = new URL(request.url, location.href).href;
+    var form = Promise.resolve(findForm(document, location.href, url));
+    if (request.form_page) {
+        form = form.then(function (found) {
+            if (found) { return found; }
+            if (!pages[request.form_page]) {
+                pages[request.form_page] = fetch(request.form_page, {credentials: 'same-origin'})
+                    .then(function (response) { return response.text(); })
+                    .then(function (html) { return new DOMParser().parseFromString(html, 'text/html'); });
+            }
+            return pages[request.form_page].then(function (doc) { return findForm(doc, request.form_page, url); });
+        });
+    }
+    return form.then(function (found) {
+        if (!found) { throw new Error('No form posting to ' + url); }
+        var body = new FormData(found);
+        Object.keys(request.data).forEach(function (key) { body.set(key, request.data[key]); });
+        if (token && !body.has('authenticity_token')) { body.set('authenticity_token', token.content); }
+        return body;
+    });
+}
+function run() {
+    if (next >= requests.length) { return Promise.resolve(); }
+    var i = next++;
+    var options = Promise.resolve({credentials: 'same-origin'});
+    if (requests[i].data) {
+        options = formBody(requests[i]).then(function (body) {
+            return {credentials: 'same-origin', method: 'POST', body: body};
+        });
+    }
+    return options
+        .then(function (options) { return fetch(requests[i].url, options); })
+        .then(function (response) { results[i] = response.status; })
+        .catch(function () { results[i] = 0; })
+        .then(run);
+}
+var workers = [];
+for (var w = 0; w < Math.min(concurrency, requests.length); w++) { workers.push(run()); }
+Promise.all(workers).then(function () { done(results); });
+"""
+
+
+def fetch_all(driver, requests: List[dict], concurrency: int = 4) -> List[bool]:
+    """
+    Runs [{"url": ..., "data": {...} or None, "form_page": ...}, ...] from the page, returns whether each of them
+    succeeded.
+    Every request takes its own slot of the rate limiter of the driver: at full speed they all go in one
+    WebDriver round trip, when requests are spaced out they go one by one.
+    """
+    if not requests:
         return []
+    rate_limiter = getattr(driver, "rate_limiter", None)
+    if rate_limiter is not None and rate_limiter.interval:
+        statuses = [status for request in requests
+                    for status in driver.execute_async_script(FETCH_ALL_SCRIPT, [request], 1)]
+    else:
+        statuses = driver.execute_async_script(FETCH_ALL_SCRIPT, requests, concurrency)
+    if rate_limiter is not None:
+        rate_limiter.report_statuses(statuses)
+    return [200 <= status < 300 for status in statuses]
 
 
 # Print iterations progress
@@ -85,6 +365,8 @@ def printProgressBar(
         fill        - Optional  : bar fill character (Str)
         printEnd    - Optional  : end character (e.g. "\r", "\r\n") (Str)
     """
+    if not total:
+        return
     percent = ("{0:." + str(decimals) + "f}").format(100 * (iteration / float(total)))
     filledLength = int(length * iteration // total)
     bar = fill * filledLength + "-" * (length - filledLength)
@@ -0,0 +1,76 @@
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from builder_const import Building
+from termcolor import cprint
+from utils import normalize_text
+
+
+# Reads every vehicle card from all tabs at once. textContent is used for the
+# names so the result does not depend on which tab is shown.
+CATALOG_SCRIPT = """
+var vehicles = [];
+var cards = document.getElementsByClassName('vehicle_type');
+for (var i = 0; i < cards.length; i++) {
+    var name = cards[i].getElementsByTagName('h3')[0];
+    var links = cards[i].getElementsByTagName('a');
+    if (name && links.length > 1) {
+        vehicles.push([name.textContent, links[1].href]);
+    }
+}
+return vehicles;
+"""
+BUILDING_ID_PLACEHOLDER = "{building_id}"
+
+
+class VehicleCatalog:
+    """Vehicle name to purchase link index, scraped once per building category and cached on disk."""
+
+    def __init__(self, path: Optional[str], max_age_hours: float = 24):
+        self.path = path
+        self.max_age = max_age_hours * 3600
+        self._lock = threading.Lock()
+        self._catalogs = self._read()
+
+    def _read(self) -> dict:
+        if not self.path or not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, 'r') as f:
+                return json.loads(f.read())
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self) -> None:
+        if not self.path:
+            return
+        with open(self.path, 'w') as f:
+            f.write(json.dumps(self._catalogs, indent=2, ensure_ascii=False))
+
+    def _fresh(self, category: str) -> Optional[dict]:
+        catalog = self._catalogs.get(category)
+        if catalog and time.time() - catalog["scraped_at"] < self.max_age:
+            return catalog["vehicles"]
+        return None
+
+    def links(self, driver, building: Building) -> Dict[str, str]:
+        """Purchase links for the building, driver has to be on its vehicles/new page if the cache is stale."""
+        with self._lock:
+            vehicles = self._fresh(building.category.name)
+            if vehicles is None:
+                cprint(f'Indexing vehicle catalog for {building.category.name}...', 'cyan')
+                vehicles = {
+                    normalize_text(name): _to_template(href, building.id)
+                    for name, href in driver.execute_script(CATALOG_SCRIPT)
+                }
+                self._catalogs[building.category.name] = {"scraped_at": time.time(), "vehicles": vehicles}
+                self._write()
+        return {name: template.replace(BUILDING_ID_PLACEHOLDER, building.id) for name, template in vehicles.items()}
+
+
+def _to_template(href: str, building_id: str) -> str:
+    return "/".join(BUILDING_ID_PLACEHOLDER if part == building_id else part for part in href.split("/"))
+
@@ -0,0 +1,86 @@
+import threading
+import time
+from typing import Callable, Optional
+
+from selenium.common import TimeoutException
+from termcolor import cprint
+
+from instrumentation import METRICS
+
+
+DEFAULT_TIMEOUT = 15
+POLL_FREQUENCY = 0.05
+
+
+class WaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.waits = {}
+
+    def record(self, label: str, elapsed: float, timed_out: bool) -> None:
+        with self._lock:
+            count, total, timeouts = self.waits.get(label, (0, 0.0, 0))
+            self.waits[label] = (count + 1, total + elapsed, timeouts + int(timed_out))
+
+    def report(self) -> None:
+        run_time = time.monotonic() - self.started
+        waited = sum(total for _, total, _ in self.waits.values())
+        cprint(f'Run took {run_time:.1f}s, waiting {waited:.1f}s ({100 * waited / max(run_time, 1e-9):.0f}%)', 'cyan')
+        for label, (count, total, timeouts) in sorted(self.waits.items(), key=lambda item: -item[1][1]):
+            cprint(f'  {label}: {count}x, {total:.1f}s, avg {total / count:.2f}s, timeouts {timeouts}', 'cyan')
+
+
+WAIT_STATS = WaitStats()
+
+
+def wait_until(driver, condition: Callable, label: str, timeout: float = DEFAULT_TIMEOUT, required: bool = True):
+    """Polls condition(driver) until it is truthy. Raises on timeout, unless the wait is not required."""
+    from selenium.webdriver.support.wait import WebDriverWait
+
+    start = time.monotonic()
+    timed_out = False
+    try:
+        return WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(condition)
+    except TimeoutException:
+        timed_out = True
+        if required:
+            raise
+        cprint(f'Timed out waiting for {label}', 'red')
+        return None
+    finally:
+        elapsed = time.monotonic() - start
+        WAIT_STATS.record(label, elapsed, timed_out)
+        METRICS.record("wait", elapsed)
+
+
+TABLE_PRESENT_SCRIPT = """
+    var table = arguments[0]
+        ? document.getElementById(arguments[0])
+        : document.getElementsByClassName(arguments[1])[0];
+    return !!table;
+"""
+
+
+def table_present(table_id: Optional[str] = None, class_name: Optional[str] = None) -> Callable:
+    """The table is on the page, rows or not, an empty table is an answer too."""
+    return lambda driver: driver.execute_script(TABLE_PRESENT_SCRIPT, table_id, class_name)
+
+
+PAGE_REPLACED_SCRIPT = "return !window.builderOldPage && document.readyState !== 'loading';"
+
+
+def page_replaced(driver) -> bool:
+    """The page a link was clicked on by click_href is gone and the one it led to is loaded."""
+    return driver.execute_script(PAGE_REPLACED_SCRIPT)
+
+
+def text_changed(element_id: str, old_text: str) -> Callable:
+    script = "var e = document.getElementById(arguments[0]); return e ? e.innerText.trim() : null;"
+
+    def condition(driver):
+        text = driver.execute_script(script, element_id)
+        return text if text is not None and text != old_text else False
+
+    return condition
+